@@ -1,81 +1,192 @@
-from bs4 import BeautifulSoup
-import os
+import argparse
+import hashlib
 import json
 import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lxml import etree, html as lxml_html
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def parse_html_files(input_dir, output_file):
+# Elements whose text is not page content (BeautifulSoup's get_text skips them too).
+NON_CONTENT_TAGS = ("script", "style", "template", "noscript")
+
+HEADER_NOISE = "Home Products Product Catalog"
+FOOTER_MARKERS = ["Accelerate Your Talent Strategy", "Back to Product Catalog"]
+
+DECLARED_CHARSET = re.compile(rb"<meta[^>]+charset|<\?xml[^>]+encoding", re.IGNORECASE)
+UTF8_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
+def _text(element):
+    return " ".join(text.strip() for text in element.itertext() if text.strip())
+
+def parse_html(raw_html, filename):
     """
-    Parses HTML files in the input directory and extracts relevant text content.
+    Extracts the title and main text of one product page. raw_html should be the file's
+    bytes, so lxml detects the encoding from the XML declaration or <meta charset>.
+    An empty page gives a record with empty content.
+    """
+    parser = None
+    if isinstance(raw_html, bytes) and not DECLARED_CHARSET.search(raw_html[:4096]):
+        # Without a declared charset libxml2 assumes Latin-1, which garbles UTF-8 pages.
+        try:
+            raw_html.decode("utf-8")
+            parser = UTF8_PARSER
+        except UnicodeDecodeError:
+            pass
+    try:
+        root = lxml_html.document_fromstring(raw_html, parser=parser)
+    except etree.ParserError:
+        return {"filename": filename, "title": "No Title", "content": "", "url_slug": filename.replace('.html', '')}
+    etree.strip_elements(root, etree.Comment, *NON_CONTENT_TAGS, with_tail=False)
+
+    # Extract Title
+    title_element = root.find(".//title")
+    title = title_element.text.strip() if title_element is not None and title_element.text else "No Title"
+
+    # Extract Main Content
+    # Heuristic: Look for main article tags or specific classes often used in SHL site
+    # (lxml elements without children are falsy, so compare with None rather than chaining `or`)
+    main_content = root.find(".//main")
+    if main_content is None:
+        main_content = root.find(".//article")
+    if main_content is None:
+        main_content = next((el for el in root.find_class("content") if el.tag == "div"), None)
+    if main_content is None:
+        # Fallback: get all body text
+        main_content = root.find(".//body")
+    text = _text(main_content) if main_content is not None else ""
+
+    # Clean up text (remove excessive whitespace)
+    clean_text = " ".join(text.split())
+
+    # Remove common header noise
+    if clean_text.startswith(HEADER_NOISE):
+        clean_text = clean_text[len(HEADER_NOISE):].strip()
+
+    # Remove common footer noise
+    for marker in FOOTER_MARKERS:
+        if marker in clean_text:
+            clean_text = clean_text.split(marker)[0].strip()
+
+    return {
+        "filename": filename,
+        "title": title,
+        "content": clean_text,
+        "url_slug": filename.replace('.html', ''),  # simplified linkage
+    }
+
+def _parse_file(args):
+    filepath, sha256 = args
+    filename = os.path.basename(filepath)
+    try:
+        with open(filepath, 'rb') as f:
+            record = parse_html(f.read(), filename)
+    except Exception as e:
+        return filename, None, str(e)
+    record["html_sha256"] = sha256
+    return filename, record, None
+
+def _file_hash(filepath):
+    with open(filepath, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _previous_records(*paths):
+    """
+    Returns {filename: (html hash, JSON line)} for records that carry their source hash,
+    from the last complete output and from an interrupted run (which wins).
+    """
+    records = {}
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a partially written last line
+                if isinstance(record, dict) and record.get("html_sha256"):
+                    records[record["filename"]] = (record["html_sha256"], line.rstrip("\n"))
+    return records
+
+def parse_html_files(input_dir, output_file, workers=None, force=False):
+    """
+    Parses the HTML files in input_dir into JSON Lines (one product per line), written as
+    records finish. Files whose HTML hash matches the previous output are not re-parsed,
+    and the output is swapped into place only once complete.
     """
-    data = []
     if not os.path.exists(input_dir):
         logging.error(f"Input directory not found: {input_dir}")
-        return
+        return None
 
-    files = [f for f in os.listdir(input_dir) if f.endswith(".html")]
+    files = sorted(f for f in os.listdir(input_dir) if f.endswith(".html"))
     logging.info(f"Found {len(files)} HTML files to parse.")
 
+    partial_file = f"{output_file}.partial"
+    previous = {} if force else _previous_records(output_file, partial_file)
+
+    reused, pending = [], []
     for filename in files:
         filepath = os.path.join(input_dir, filename)
+        sha256 = _file_hash(filepath)
+        if previous.get(filename, (None,))[0] == sha256:
+            reused.append(previous[filename][1])
+        else:
+            pending.append((filepath, sha256))
+    logging.info(f"{len(reused)} unchanged, {len(pending)} to parse.")
+
+    stats = {"parsed": 0, "unchanged": len(reused), "failed": 0}
+    with open(partial_file, 'w', encoding='utf-8') as out:
+        for line in reused:
+            out.write(line + "\n")
+        out.flush()
+
+        if workers == 0 or len(pending) < 2:
+            results = map(_parse_file, pending)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            # Completion order, so one slow page does not hold back the records behind it.
+            results = (future.result() for future in as_completed(
+                [executor.submit(_parse_file, item) for item in pending]
+            ))
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                soup = BeautifulSoup(f.read(), 'html.parser')
-                
-                # Extract Title
-                title = soup.title.string.strip() if soup.title else "No Title"
-                
-                # Extract Main Content
-                # Heuristic: Look for main article tags or specific classes often used in SHL site
-                # This might need refinement based on actual HTML structure
-                content_sections = []
-                
-                # Try to find main content area (generic approach)
-                main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
-                
-                if main_content:
-                    text = main_content.get_text(separator=' ', strip=True)
+            for filename, record, error in results:
+                if error:
+                    logging.error(f"Error parsing {filename}: {error}")
+                    stats["failed"] += 1
+                    continue
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                stats["parsed"] += 1
+                if record["content"]:
+                    logging.info(f"Parsed {filename}")
                 else:
-                    # Fallback: get all body text
-                    text = soup.body.get_text(separator=' ', strip=True) if soup.body else ""
-                
-                # Clean up text (remove excessive whitespace)
-                clean_text = " ".join(text.split())
-
-                # Remove common header noise
-                header_noise = "Home Products Product Catalog"
-                if clean_text.startswith(header_noise):
-                    clean_text = clean_text[len(header_noise):].strip()
-
-                # Remove common footer noise
-                footer_markers = ["Accelerate Your Talent Strategy", "Back to Product Catalog"]
-                for marker in footer_markers:
-                    if marker in clean_text:
-                        clean_text = clean_text.split(marker)[0].strip()
-                
-                data.append({
-                    "filename": filename,
-                    "title": title,
-                    "content": clean_text,
-                    "url_slug": filename.replace('.html', '') # simplified linkage
-                })
-                logging.info(f"Parsed {filename}")
-                
-        except Exception as e:
-            logging.error(f"Error parsing {filename}: {e}")
-    
-    try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-        logging.info(f"Successfully saved parsed data to {output_file}")
-    except Exception as e:
-        logging.error(f"Error saving output file: {e}")
+                    logging.warning(f"Parsed {filename}: the page is empty")
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    os.replace(partial_file, output_file)
+    logging.info(
+        f"Saved parsed data to {output_file}: {stats['parsed']} parsed, {stats['unchanged']} unchanged, "
+        f"{stats['failed']} failed."
+    )
+    return stats
 
 if __name__ == "__main__":
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    input_html_dir = os.path.join(base_dir, 'raw_html')
-    output_json = os.path.join(base_dir, '..', 'shl_products.json')
-    
-    parse_html_files(input_html_dir, output_json)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Parse scraped SHL product pages into JSON Lines.")
+    parser.add_argument("--input-dir", default=os.path.join(base_dir, 'raw_html'))
+    parser.add_argument("--output", default=os.path.join(base_dir, '..', 'shl_products.jsonl'))
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Parser processes (default: CPU count, 0 parses in-process).")
+    parser.add_argument("--force", action="store_true", help="Re-parse every file.")
+    args = parser.parse_args()
+
+    parse_html_files(args.input_dir, args.output, workers=args.workers, force=args.force)
@@ -1,73 +1,254 @@
-import pandas as pd
-import requests
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
 import os
 import time
-import logging
+from urllib.parse import urlsplit
+
+import httpx
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def scrape_urls(input_file, output_dir):
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+# Kept in the output directory: validators and content hashes from the last run, and a
+# report of which pages changed in the latest run.
+STATE_FILE = ".scrape_state.json"
+CHANGES_FILE = "changes.json"
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
     """
-    Reads URLs from the Excel file and saves the HTML content to the output directory.
+    Allows `rate` requests per second on average with bursts of up to `capacity`.
     """
-    if not os.path.exists(input_file):
-        logging.error(f"Input file not found: {input_file}")
-        return
 
-    try:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class HostLimiter:
+    """
+    Per-host politeness: at most max_concurrency requests in flight and a token bucket
+    on the request rate.
+    """
+
+    def __init__(self, max_concurrency, rate, burst):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.hosts = {}
+
+    def _for(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = (asyncio.Semaphore(self.max_concurrency), TokenBucket(self.rate, self.burst))
+        return self.hosts[host]
+
+    async def __call__(self, url, request):
+        semaphore, bucket = self._for(urlsplit(url).netloc)
+        async with semaphore:
+            await bucket.acquire()
+            return await request()
+
+def read_urls(input_file):
+    """
+    Reads the URLs to scrape from the labeled Excel file (column Assessment_url) or from a
+    text file with one URL per line.
+    """
+    if input_file.endswith((".xlsx", ".xls")):
+        import pandas as pd
         df = pd.read_excel(input_file)
         if 'Assessment_url' not in df.columns:
-            logging.error("Column 'Assessment_url' not found in the Excel file.")
-            return
-            
-        urls = df['Assessment_url'].unique()
-        logging.info(f"Found {len(urls)} unique URLs to scrape.")
-        
-        os.makedirs(output_dir, exist_ok=True)
-        
-        for i, url in enumerate(urls):
+            raise ValueError("Column 'Assessment_url' not found in the Excel file.")
+        urls = df['Assessment_url'].dropna().unique()
+    else:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return list(dict.fromkeys(urls))
+
+def filename_for(url, i):
+    # Example: https://www.shl.com/.../view/java-8-new/ -> java-8-new.html
+    filename = url.strip('/').split('/')[-1] or "index"
+    safe_filename = "".join([c for c in filename if c.isalnum() or c in ('-', '_')]).strip()
+    return f"{safe_filename or f'page_{i}'}.html"
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        logging.warning(f"Ignoring unreadable {path}")
+        return default
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _retry_delay(response, attempt):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return float(retry_after)
+    return 2 ** attempt
+
+async def _fetch(client, limiter, url, entry, force, max_retries):
+    headers = {}
+    if entry and not force:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = None
+    for attempt in range(max_retries + 1):
+        try:
+            response = await limiter(url, lambda: client.get(url, headers=headers))
+            if response.status_code not in RETRY_STATUSES:
+                return response
+        except httpx.TransportError as e:
+            if attempt == max_retries:
+                raise
+            logging.warning(f"Error fetching {url} ({e}); retrying.")
+        if attempt < max_retries:
+            await asyncio.sleep(_retry_delay(response, attempt))
+    return response
+
+async def scrape_urls_async(urls, output_dir, max_per_host=4, rate=2.0, burst=4, timeout=10.0,
+                            force=False, max_retries=3, prune=False):
+    """
+    Downloads every URL into output_dir with conditional GETs, so pages whose ETag or
+    Last-Modified (or, failing those, content hash) are unchanged are not rewritten.
+    With prune, pages scraped earlier whose URL is not in urls are deleted; only use it
+    when urls is the full catalog. Returns the change manifest, which is also written to
+    output_dir/changes.json.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state_path = os.path.join(output_dir, STATE_FILE)
+    state = _load_json(state_path, {})
+    changes = {"changed": [], "unchanged": [], "failed": [], "removed": []}
+
+    limiter = HostLimiter(max_per_host, rate, burst)
+    limits = httpx.Limits(max_connections=max_per_host * 8, max_keepalive_connections=max_per_host * 8)
+    async with httpx.AsyncClient(
+        headers={'User-Agent': USER_AGENT}, timeout=timeout, limits=limits, follow_redirects=True
+    ) as client:
+
+        async def scrape(i, url):
+            entry = state.get(url)
+            filename = (entry or {}).get("filename") or filename_for(url, i)
+            output_path = os.path.join(output_dir, filename)
             try:
-                logging.info(f"Scraping ({i+1}/{len(urls)}): {url}")
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                }
-                response = requests.get(url, headers=headers, timeout=10)
-                
-                if response.status_code == 200:
-                    # Create a valid filename from URL
-                    # Example: https://www.shl.com/en/assessments/cognitive-ability/ -> cognitive-ability.html
-                    filename = url.strip('/').split('/')[-1] 
-                    if not filename:
-                        filename = "index"
-                    
-                    # Ensure unique filenames if multiple URLs end with same segment
-                    safe_filename = "".join([c for c in filename if c.isalnum() or c in ('-', '_')]).strip()
-                    if not safe_filename:
-                        safe_filename = f"page_{i}"
-                    
-                    output_path = os.path.join(output_dir, f"{safe_filename}.html")
-                    
-                    with open(output_path, 'w', encoding='utf-8') as f:
-                        f.write(response.text)
-                    logging.info(f"Saved to {output_path}")
-                else:
-                    logging.warning(f"Failed to fetch {url}: Status {response.status_code}")
+                response = await _fetch(client, limiter, url, entry if os.path.exists(output_path) else None,
+                                        force, max_retries)
             except Exception as e:
                 logging.error(f"Error fetching {url}: {e}")
-            
-            time.sleep(1) # Be polite to the server
+                changes["failed"].append({"url": url, "filename": filename, "error": str(e)})
+                return
+
+            if response.status_code == 304:
+                changes["unchanged"].append({"url": url, "filename": filename})
+                return
+            if response.status_code != 200:
+                logging.warning(f"Failed to fetch {url}: Status {response.status_code}")
+                changes["failed"].append({"url": url, "filename": filename, "status": response.status_code})
+                return
+
+            body = response.content
+            sha256 = hashlib.sha256(body).hexdigest()
+            state[url] = {
+                "filename": filename,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha256": sha256,
+                "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            if entry and entry.get("sha256") == sha256 and os.path.exists(output_path):
+                changes["unchanged"].append({"url": url, "filename": filename})
+                return
+            _write_atomic(output_path, body)
+            changes["changed"].append({"url": url, "filename": filename, "sha256": sha256})
+            logging.info(f"Saved {url} to {output_path}")
 
+        logging.info(f"Scraping {len(urls)} URLs...")
+        await asyncio.gather(*(scrape(i, url) for i, url in enumerate(urls)))
+
+    for url in (set(state) - set(urls)) if prune else ():
+        entry = state.pop(url)
+        path = os.path.join(output_dir, entry["filename"])
+        if os.path.exists(path):
+            os.remove(path)
+        changes["removed"].append({"url": url, "filename": entry["filename"]})
+
+    for key in changes:
+        changes[key].sort(key=lambda item: item["url"])
+    changes["generated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    _write_atomic(state_path, json.dumps(state, indent=2).encode("utf-8"))
+    _write_atomic(os.path.join(output_dir, CHANGES_FILE), json.dumps(changes, indent=2).encode("utf-8"))
+    logging.info(
+        f"{len(changes['changed'])} changed, {len(changes['unchanged'])} unchanged, "
+        f"{len(changes['failed'])} failed, {len(changes['removed'])} removed."
+    )
+    return changes
+
+def scrape_urls(input_file, output_dir, **kwargs):
+    """
+    Reads URLs from the Excel (or text) file and saves the HTML content to the output directory.
+    """
+    if not os.path.exists(input_file):
+        logging.error(f"Input file not found: {input_file}")
+        return None
+
+    try:
+        urls = read_urls(input_file)
     except Exception as e:
         logging.error(f"An error occurred: {e}")
+        return None
+    logging.info(f"Found {len(urls)} unique URLs to scrape.")
+    return asyncio.run(scrape_urls_async(urls, output_dir, **kwargs))
 
 if __name__ == "__main__":
-    # Path relative to where the script is run (usually project root or script dir)
-    # Assuming script is run from d:\SHL\data\scraping or d:\SHL
-    
-    # Adjust paths based on execution context
     base_dir = os.path.dirname(os.path.abspath(__file__))
-    input_excel = os.path.join(base_dir, '..', 'Gen_AI Dataset.xlsx')
-    output_html_dir = os.path.join(base_dir, 'raw_html')
-    
-    scrape_urls(input_excel, output_html_dir)
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="Download SHL product pages, re-fetching only changed ones.")
+    parser.add_argument("--input", default=os.path.join(base_dir, '..', 'Gen_AI Dataset.xlsx'),
+                        help="Excel file with an Assessment_url column, or a text file with one URL per line.")
+    parser.add_argument("--output-dir", default=os.path.join(base_dir, 'raw_html'))
+    parser.add_argument("--per-host", type=int, default=4, help="Maximum concurrent requests per host.")
+    parser.add_argument("--rate", type=float, default=2.0, help="Average requests per second per host.")
+    parser.add_argument("--burst", type=int, default=4, help="Token bucket capacity per host.")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--force", action="store_true", help="Ignore stored ETag/Last-Modified validators.")
+    parser.add_argument("--prune", action="store_true",
+                        help="Delete pages scraped earlier whose URL is no longer in --input (use with the full list).")
+    args = parser.parse_args()
+
+    scrape_urls(
+        args.input,
+        args.output_dir,
+        max_per_host=args.per_host,
+        rate=args.rate,
+        burst=args.burst,
+        timeout=args.timeout,
+        force=args.force,
+        prune=args.prune
+    )
@@ -1,20 +1,123 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from src.rag.engine import AssessmentRecommendationEngine
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from src.rag.errors import EngineOverloadedError
+from src.vector_store.filters import FILTER_FIELDS
+from src.utils.timing import StageTimer
+from src.utils import metrics
 import uvicorn
+import asyncio
+import json
+import os
+import threading
+import time
 
-app = FastAPI(title="SHL Assessment Recommendation Engine")
+# The engine (sentence-transformers, FAISS, Gemini client) is imported and built after the
+# server starts, so importing this module stays cheap and health checks answer immediately.
+# ENGINE_STARTUP=eager blocks startup until the engine is ready instead.
+engine = None
+engine_status = "starting"
+engine_error = None
 
-try:
-    engine = AssessmentRecommendationEngine()
-except Exception as e:
-    print(f"Failed to initialize RAG engine: {e}")
-    engine = None
+def _start_engine():
+    global engine, engine_status, engine_error
+    try:
+        from src.rag.engine import AssessmentRecommendationEngine
+        candidate = AssessmentRecommendationEngine()
+        candidate.warm_up()
+        engine = candidate
+        engine_status = "ready"
+    except Exception as e:
+        print(f"Failed to initialize RAG engine: {e}")
+        engine_error = str(e)
+        engine_status = "failed"
+
+@asynccontextmanager
+async def lifespan(app):
+    if os.getenv("ENGINE_STARTUP", "background") == "eager":
+        _start_engine()
+    else:
+        threading.Thread(target=_start_engine, name="engine-startup", daemon=True).start()
+    yield
+    if engine is not None:
+        engine.close()
+
+app = FastAPI(title="SHL Assessment Recommendation Engine", lifespan=lifespan)
+
+if metrics.ENABLED:
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        started = time.perf_counter()
+        response = await call_next(request)
+        route = request.scope.get("route")
+        metrics.REQUEST_SECONDS.labels(getattr(route, "path", "unmatched")).observe(time.perf_counter() - started)
+        return response
+
+def _require_engine():
+    if engine is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Recommendation engine is {engine_status}.",
+            headers={"Retry-After": "5"} if engine_status == "starting" else None
+        )
+    return engine
+
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "5000"))
+# Seconds an overloaded client is told to wait before retrying.
+OVERLOAD_RETRY_AFTER = 1
+
+class SearchFilters(BaseModel):
+    max_duration: Optional[int] = None
+    test_types: Optional[List[str]] = None
+    remote: Optional[bool] = None
+    adaptive: Optional[bool] = None
+
+    def filters(self):
+        return {field: getattr(self, field) for field in FILTER_FIELDS}
 
-class QueryRequest(BaseModel):
+class QueryRequest(SearchFilters):
     query: str
 
+class BatchQueryRequest(SearchFilters):
+    queries: List[str]
+    k: int = 5
+    summarize: bool = False
+
+class BatchQueryResult(BaseModel):
+    query: str
+    assessments: List[dict]
+    recommendation: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryResult]
+    timings_ms: dict
+
+@app.get("/health")
+def health():
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    body = {"status": engine_status}
+    if engine_error:
+        body["detail"] = engine_error
+    return JSONResponse(body, status_code=200 if engine_status == "ready" else 503)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    rendered = metrics.render()
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled or prometheus-client is not installed.")
+    body, content_type = rendered
+    return Response(body, media_type=content_type)
+
+@app.get("/stats")
+def stats():
+    return _require_engine().stats()
+
 @app.get("/", response_class=HTMLResponse)
 def read_root():
     return """
@@ -45,6 +148,21 @@ def read_root():
             </div>
 
             <script>
+                function renderAssessments(container, assessments) {
+                    const list = document.createElement('ol');
+                    for (const item of assessments) {
+                        const li = document.createElement('li');
+                        const link = document.createElement('a');
+                        link.href = item.url;
+                        link.target = '_blank';
+                        link.textContent = item.title;
+                        li.appendChild(link);
+                        li.appendChild(document.createTextNode(' (' + item.duration + ', ' + item.test_type + ')'));
+                        list.appendChild(li);
+                    }
+                    container.appendChild(list);
+                }
+
                 async function getRecommendation() {
                     const query = document.getElementById('query').value;
                     if (!query) return;
@@ -55,17 +173,49 @@ def read_root():
                     resultDiv.textContent = "Analyzing requirements and searching catalog...";
                     
                     try {
-                        const response = await fetch('/recommend', {
+                        const response = await fetch('/recommend/stream', {
                             method: 'POST',
                             headers: { 'Content-Type': 'application/json' },
                             body: JSON.stringify({ query: query })
                         });
-                        const data = await response.json();
-                        resultDiv.className = '';
-                        if (data.recommendation) {
-                            resultDiv.textContent = data.recommendation;
-                        } else {
+                        if (!response.ok) {
+                            const data = await response.json();
+                            resultDiv.className = '';
                             resultDiv.textContent = "Error: " + (data.detail || "Unknown error");
+                            return;
+                        }
+
+                        const answer = document.createElement('div');
+                        const reader = response.body.getReader();
+                        const decoder = new TextDecoder();
+                        let buffer = '';
+                        while (true) {
+                            const { value, done } = await reader.read();
+                            if (done) break;
+                            buffer += decoder.decode(value, { stream: true });
+                            let boundary;
+                            while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {
+                                const raw = buffer.slice(0, boundary);
+                                buffer = buffer.slice(boundary + 2);
+                                let event = 'message', data = '';
+                                for (const line of raw.split('\\n')) {
+                                    if (line.startsWith('event: ')) event = line.slice(7);
+                                    else if (line.startsWith('data: ')) data += line.slice(6);
+                                }
+                                const payload = JSON.parse(data);
+                                if (event === 'results') {
+                                    resultDiv.className = '';
+                                    resultDiv.textContent = '';
+                                    renderAssessments(resultDiv, payload.assessments);
+                                    resultDiv.appendChild(answer);
+                                } else if (event === 'token') {
+                                    answer.textContent += payload;
+                                } else if (event === 'fallback') {
+                                    answer.textContent = payload;
+                                } else if (event === 'error') {
+                                    answer.textContent += "\\nError: " + payload.detail;
+                                }
+                            }
                         }
                     } catch (e) {
                         resultDiv.className = '';
@@ -78,15 +228,80 @@ def read_root():
     """
 
 @app.post("/recommend")
-def get_recommendation(request: QueryRequest):
-    if not engine:
-        raise HTTPException(status_code=503, detail="Recommendation engine is not initialized.")
+async def get_recommendation(request: QueryRequest):
+    engine = _require_engine()
     
     try:
-        result = engine.recommend(request.query)
+        result = await engine.arecommend(request.query, request.filters())
         return {"recommendation": result}
+    except EngineOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(OVERLOAD_RETRY_AFTER)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/recommend/batch", response_model=BatchQueryResponse)
+async def batch_recommendation(request: BatchQueryRequest):
+    engine = _require_engine()
+    if len(request.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_QUERIES} queries per batch.")
+    if request.k < 1:
+        raise HTTPException(status_code=422, detail="k must be at least 1.")
+
+    timer = StageTimer()
+    with timer.stage("total"):
+        loop = asyncio.get_running_loop()
+        doc_lists = await loop.run_in_executor(
+            engine.search_executor, engine.search_batch, request.queries, request.k, timer, request.filters()
+        )
+        results = [
+            BatchQueryResult(query=query, assessments=engine.summarize_documents(docs))
+            for query, docs in zip(request.queries, doc_lists)
+        ]
+
+        if request.summarize:
+            limit = asyncio.Semaphore(engine.batch_llm_concurrency)
+
+            async def summarize(query, docs):
+                async with limit:
+                    return await engine.agenerate(query, [doc.id for doc in docs], docs)
+
+            with timer.stage("llm"):
+                summaries = await asyncio.gather(
+                    *(summarize(query, docs) for query, docs in zip(request.queries, doc_lists)),
+                    return_exceptions=True
+                )
+            for result, summary in zip(results, summaries):
+                if isinstance(summary, Exception):
+                    result.error = str(summary)
+                else:
+                    result.recommendation = summary
+
+    return BatchQueryResponse(results=results, timings_ms=timer.as_dict())
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/recommend/stream")
+async def stream_recommendation(request: QueryRequest):
+    engine = _require_engine()
+
+    async def events():
+        try:
+            async for event, data in engine.astream_recommend(request.query, request.filters()):
+                yield _sse(event, data)
+        except EngineOverloadedError as e:
+            # The response has already started, so the 503 of /recommend becomes part of the event.
+            yield _sse("error", {"detail": str(e), "status": 503, "retry_after": OVERLOAD_RETRY_AFTER})
+            yield _sse("done", {})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e), "status": 500})
+            yield _sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     uvicorn.run("src.api.main:app", host="127.0.0.1", port=8000, reload=True)
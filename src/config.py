@@ -3,16 +3,28 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Optional: without it the engine serves search results only and skips Gemini generation.
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables. Please check your .env file.")
-
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 SCRAPING_DIR = os.path.join(DATA_DIR, "scraping")
 RAW_HTML_DIR = os.path.join(SCRAPING_DIR, "raw_html")
-PARSED_DATA_PATH = os.path.join(DATA_DIR, "shl_products.json")
+# The parser writes JSON Lines; a catalog in the older single-array JSON format is read
+# from LEGACY_PARSED_DATA_PATH when no JSON Lines file exists yet.
+PARSED_DATA_PATH = os.path.join(DATA_DIR, "shl_products.jsonl")
+LEGACY_PARSED_DATA_PATH = os.path.join(DATA_DIR, "shl_products.json")
+FAISS_INDEX_DIR = os.path.join(DATA_DIR, "faiss_index")
+INGEST_CHECKPOINT_DIR = os.path.join(DATA_DIR, ".ingest_checkpoint")
 
 EMBEDDING_MODEL = "models/embedding-001"
 GENERATION_MODEL = "gemini-pro"
+
+# Ingestion: chunks are embedded in batches of EMBED_BATCH_SIZE. EMBED_WORKERS > 1
+# fans batches out across a process pool (local embedders only).
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+
+# FAISS index type: flat, hnsw, ivf_flat or ivf_pq. Unset keeps the type and tuned
+# search parameters of the existing index (flat on a first build).
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE")
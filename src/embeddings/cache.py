@@ -0,0 +1,149 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.utils.metrics import CACHE_LOOKUPS
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a persistent SQLite cache keyed by model name and text
+    hash. Once the cache holds more than max_entries vectors, the least recently used rows
+    are evicted, evict_fraction of max_entries at a time. Hits are not written back one by
+    one: their last_used times are buffered and flushed every touch_interval seconds
+    or with the next insert.
+    """
+
+    def __init__(self, underlying, model_name, path, max_entries=200000, symmetric=True,
+                 evict_fraction=0.05, touch_interval=30.0):
+        self.underlying = underlying
+        # Symmetric models embed queries and documents identically, so a batch of queries
+        # can go through embed_documents in a single forward pass.
+        self.symmetric = symmetric
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_chunk = max(1, int(max_entries * evict_fraction))
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        # Rows this process knows of; other processes sharing the file are only seen when
+        # the count is refreshed before an eviction.
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._touched = {}
+        self._last_flush = time.monotonic()
+
+    def _key(self, kind, text):
+        # Query and document embeddings differ for some providers, so they are cached apart.
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        unique_keys = list(set(keys))
+        with self._lock:
+            for i in range(0, len(unique_keys), 500):
+                part = unique_keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update((key, np.frombuffer(blob, dtype=np.float32)) for key, blob in rows)
+            if found:
+                now = time.time()
+                self._touched.update((key, now) for key in found)
+                if time.monotonic() - self._last_flush >= self.touch_interval:
+                    self._write_touched()
+                    self._conn.commit()
+        return found
+
+    def _write_touched(self):
+        # Called with the lock held; the caller commits.
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self._touched.items()]
+            )
+            self._touched.clear()
+        self._last_flush = time.monotonic()
+
+    def _store(self, items):
+        now = time.time()
+        with self._lock:
+            self._write_touched()
+            # A key another process inserted meanwhile has the same vector, so it is kept.
+            inserted = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items]
+            ).rowcount
+            self._entries += max(0, inserted)
+            if self._entries > self.max_entries:
+                self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                if self._entries > self.max_entries:
+                    excess = self._entries - self.max_entries + self.evict_chunk
+                    self._conn.execute(
+                        "DELETE FROM embeddings WHERE key IN "
+                        "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                        (excess,)
+                    )
+                    self._entries -= excess
+            self._conn.commit()
+
+    def flush(self):
+        """
+        Writes buffered last_used times to disk.
+        """
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+
+    def _embed(self, kind, texts, embed_fn):
+        keys = [self._key(kind, text) for text in texts]
+        cached = self._lookup(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hits = len(keys) - sum(1 for key in keys if key in missing)
+        self.hits += hits
+        self.misses += len(missing)
+        CACHE_LOOKUPS.labels("embedding", "hit").inc(hits)
+        CACHE_LOOKUPS.labels("embedding", "miss").inc(len(missing))
+
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh.items())
+            cached.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in fresh.items())
+
+        return [cached[key].tolist() for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed("document", texts, self.underlying.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed("query", [text], lambda texts: [self.underlying.embed_query(texts[0])])[0]
+
+    def embed_queries(self, texts):
+        if self.symmetric:
+            batch_fn = self.underlying.embed_documents
+        else:
+            batch_fn = lambda batch: [self.underlying.embed_query(text) for text in batch]
+        return self._embed("query", texts, batch_fn)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": self._entries}
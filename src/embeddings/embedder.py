@@ -1,9 +1,80 @@
-from langchain_huggingface import HuggingFaceEmbeddings
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_embedding_model():
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    return embeddings
+HF_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+GOOGLE_EMBEDDING_MODEL = "models/embedding-001"
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", ".embedding_cache.sqlite"
+)
+
+# Backends that call out to a hosted API and can therefore be rate limited.
+REMOTE_BACKENDS = {"google"}
+
+def get_embedding_backend():
+    return os.getenv("EMBEDDING_BACKEND", "huggingface").lower()
+
+def is_remote_backend(backend=None):
+    return (backend or get_embedding_backend()) in REMOTE_BACKENDS
+
+def _onnx_quantized():
+    return os.getenv("ONNX_QUANTIZED", "1") != "0"
+
+def get_embedding_model_name(backend=None):
+    backend = backend or get_embedding_backend()
+    if backend == "google":
+        return GOOGLE_EMBEDDING_MODEL
+    if backend == "onnx":
+        # Quantized vectors differ slightly from fp32 ones, so they get their own cache entries.
+        return f"{HF_EMBEDDING_MODEL}-onnx-{'int8' if _onnx_quantized() else 'fp32'}"
+    return HF_EMBEDDING_MODEL
+
+def _load_backend(backend):
+    if backend == "google":
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        return GoogleGenerativeAIEmbeddings(
+            model=GOOGLE_EMBEDDING_MODEL,
+            google_api_key=os.getenv("GEMINI_API_KEY")
+        )
+    if backend == "onnx":
+        from src.embeddings.onnx_embedder import OnnxEmbeddings
+        threads = int(os.getenv("ONNX_THREADS", "0")) or None
+        return OnnxEmbeddings(quantized=_onnx_quantized(), threads=threads)
+    if backend != "huggingface":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=HF_EMBEDDING_MODEL)
+
+def get_embedding_model(backend=None, cache=None):
+    """
+    Returns the configured embedder. Unless disabled with EMBEDDING_CACHE=0 it is wrapped
+    in the on-disk cache shared by ingestion and query embedding.
+    """
+    backend = backend or get_embedding_backend()
+    embeddings = _load_backend(backend)
+
+    if cache is None:
+        cache = os.getenv("EMBEDDING_CACHE", "1") != "0"
+    if not cache:
+        return embeddings
+
+    from src.embeddings.cache import CachedEmbeddings
+    return CachedEmbeddings(
+        embeddings,
+        model_name=get_embedding_model_name(backend),
+        path=os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+        max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000")),
+        symmetric=not is_remote_backend(backend)
+    )
+
+def embed_queries(embeddings, texts):
+    """
+    Embeds a batch of queries, in a single model call where the embedder supports it.
+    """
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(texts)
+    if type(embeddings).__name__ == "HuggingFaceEmbeddings":
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
@@ -0,0 +1,199 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.config import DATA_DIR
+from src.embeddings.embedder import HF_EMBEDDING_MODEL
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(DATA_DIR, "onnx", HF_EMBEDDING_MODEL))
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+# all-MiniLM-L6-v2 is trained on, and truncated by sentence-transformers at, 256 tokens.
+MAX_SEQ_LENGTH = 256
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformers compatible embedder running an exported model on ONNX Runtime:
+    mean pooling over the attention mask followed by L2 normalization, exactly as the
+    all-MiniLM-L6-v2 pipeline does. Only onnxruntime and tokenizers are imported, so
+    workers start without loading torch.
+    """
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=True, batch_size=32, threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found. Export it with: python src/embeddings/onnx_embedder.py export"
+            )
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.batch_size = batch_size
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        hidden = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        texts = [text.replace("\n", " ") for text in texts]
+        # Batching texts of similar length keeps padding, and so wasted compute, small.
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        vectors = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            batch = self._embed_batch([texts[row] for row in rows])
+            if vectors.shape[1] == 0:
+                vectors = np.zeros((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[rows] = batch
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts):
+        return self.embed_documents(texts)
+
+def export_onnx_model(output_dir=ONNX_MODEL_DIR, model_name=f"sentence-transformers/{HF_EMBEDDING_MODEL}"):
+    """
+    Exports the transformer to ONNX and writes a dynamically int8-quantized copy next to it.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+
+    sample = tokenizer(["an example sentence", "another one"], padding=True, return_tensors="pt")
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            HiddenStates(model),
+            tuple(sample[name] for name in names),
+            fp32_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+            opset_version=17,
+            dynamo=False
+        )
+
+    int8_path = os.path.join(output_dir, INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    for path in (fp32_path, int8_path):
+        print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+def _timed_embed(embeddings, texts):
+    started = time.perf_counter()
+    for text in texts:
+        embeddings.embed_query(text)
+    single_ms = (time.perf_counter() - started) / len(texts) * 1000
+    return np.asarray(embeddings.embed_documents(texts), dtype=np.float32), single_ms
+
+def check_parity(index_path=os.path.join(DATA_DIR, "faiss_index"), k=10, tolerance=0.02):
+    """
+    Compares the quantized model with the fp32 sentence-transformers model on the labeled
+    evaluation queries: cosine similarity of the query vectors, overlap of the top-k rows
+    each retrieves, and Recall@k against the labels. Returns False if int8 Recall@k is
+    more than tolerance below fp32.
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+    from src.evaluation.recall import load_labeled_queries, recall_at_k, url_slug
+    from src.vector_store.faiss_index import load_faiss_index
+
+    labeled = load_labeled_queries()
+    queries = list(labeled)
+
+    reference = HuggingFaceEmbeddings(model_name=HF_EMBEDDING_MODEL)
+    quantized = OnnxEmbeddings(quantized=True)
+    ref_vectors, ref_ms = _timed_embed(reference, queries)
+    int8_vectors, int8_ms = _timed_embed(quantized, queries)
+    cosine = (ref_vectors * int8_vectors).sum(axis=1) / (
+        np.linalg.norm(ref_vectors, axis=1) * np.linalg.norm(int8_vectors, axis=1)
+    )
+
+    vector_store = load_faiss_index(index_path, reference)
+    # Several chunks of one product can be retrieved; Recall@k counts products.
+    fetch_k = k * 5
+    _, ref_rows = vector_store.index.search(ref_vectors, fetch_k)
+    _, int8_rows = vector_store.index.search(int8_vectors, fetch_k)
+
+    def slugs(rows):
+        found = []
+        for row in rows:
+            if row == -1:
+                continue
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[row])
+            slug = url_slug(doc.metadata.get("url_slug", ""))
+            if slug not in found:
+                found.append(slug)
+        return found
+
+    overlap = np.mean([len(set(a[:k]) & set(b[:k])) / k for a, b in zip(ref_rows, int8_rows)])
+    ref_recall = np.mean([recall_at_k(slugs(rows), labeled[q], k) for q, rows in zip(queries, ref_rows)])
+    int8_recall = np.mean([recall_at_k(slugs(rows), labeled[q], k) for q, rows in zip(queries, int8_rows)])
+
+    print(f"Queries: {len(queries)}")
+    print(f"Cosine similarity to fp32: mean {cosine.mean():.4f}, min {cosine.min():.4f}")
+    print(f"Top-{k} chunk overlap with fp32: {overlap:.3f}")
+    print(f"Recall@{k}: fp32 {ref_recall:.3f}, int8 {int8_recall:.3f} (tolerance {tolerance})")
+    print(f"Per-query latency: fp32 {ref_ms:.1f} ms, int8 {int8_ms:.1f} ms")
+    return int8_recall >= ref_recall - tolerance
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and validate the ONNX int8 embedding model.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    check_parser = subparsers.add_parser("check")
+    check_parser.add_argument("--k", type=int, default=10)
+    check_parser.add_argument("--tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx_model(args.output_dir)
+    elif not check_parity(k=args.k, tolerance=args.tolerance):
+        sys.exit(1)
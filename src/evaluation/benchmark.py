@@ -0,0 +1,212 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.evaluation.recall import (
+    load_labeled_queries, recall_at_k, average_precision_at_k, unique_in_order, url_slug, LABELED_QUERIES_PATH
+)
+from src.utils.timing import StageTimer, percentiles
+
+DEFAULT_OUTPUT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "Outputs", "benchmark.json"
+)
+
+def quality_metrics(ranked_slugs, labeled, ks):
+    """
+    Mean Recall@k and MAP@k over the labeled queries; ranked_slugs maps each query to the
+    assessment slugs it returned, best first.
+    """
+    metrics = {}
+    for k in ks:
+        metrics[f"recall@{k}"] = round(sum(
+            recall_at_k(ranked_slugs[query], relevant, k) for query, relevant in labeled.items()
+        ) / len(labeled), 4)
+        metrics[f"map@{k}"] = round(sum(
+            average_precision_at_k(ranked_slugs[query], relevant, k) for query, relevant in labeled.items()
+        ) / len(labeled), 4)
+    return metrics
+
+def _run_concurrently(call, queries, concurrency, total_requests):
+    """
+    Issues total_requests calls from concurrency threads and returns (latencies_ms, seconds).
+    Requests get a unique suffix so result caches cannot answer them.
+    """
+    requests = [f"{queries[i % len(queries)]} ({i})" for i in range(total_requests)]
+
+    def timed(query):
+        started = time.perf_counter()
+        call(query)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, requests))
+    return latencies, time.perf_counter() - started
+
+def _throughput(call, queries, levels, total_requests):
+    results = []
+    for concurrency in levels:
+        latencies, seconds = _run_concurrently(call, queries, concurrency, max(total_requests, concurrency))
+        results.append({
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "qps": round(len(latencies) / seconds, 2),
+            **percentiles(latencies),
+        })
+        print(f"  concurrency {concurrency:>3}: {results[-1]['qps']:>8.1f} req/s, p95 {results[-1]['p95']} ms")
+    return results
+
+def benchmark_engine(labeled, ks, repeats, levels, total_requests, llm_latency_ms):
+    from src.rag.engine import AssessmentRecommendationEngine
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    engine = AssessmentRecommendationEngine()
+    engine.warm_up()
+    queries = list(labeled)
+    k = max(ks)
+
+    print("Measuring retrieval quality and per-stage latency...")
+    stage_samples, ranked_slugs = {}, {}
+    for _ in range(repeats):
+        for query in queries:
+            engine.retrieval_cache.clear()
+            if engine.reranker is not None:
+                engine.reranker.score_cache.clear()
+            timer = StageTimer()
+            started = time.perf_counter()
+            docs = engine.search_batch([query], k=k, timer=timer)[0]
+            timer.timings["total"] = (time.perf_counter() - started) * 1000
+            for stage, ms in timer.timings.items():
+                stage_samples.setdefault(stage, []).append(ms)
+            ranked_slugs[query] = unique_in_order(url_slug(doc.metadata.get("url_slug", "")) for doc in docs)
+
+    # The LLM is replaced by a local stub with a fixed delay, so the numbers show the
+    # overhead around generation rather than the hosted model's latency.
+    engine.llm = FakeListChatModel(responses=["Stub recommendation."], sleep=llm_latency_ms / 1000)
+    for query in queries:
+        engine.response_cache.clear()
+        started = time.perf_counter()
+        engine.recommend(query)
+        stage_samples.setdefault("recommend_with_llm_stub", []).append((time.perf_counter() - started) * 1000)
+
+    print("Measuring throughput...")
+    engine.retrieval_cache.clear()
+    throughput = _throughput(lambda query: engine.search(query, k=k), queries, levels, total_requests)
+
+    return {
+        "quality": quality_metrics(ranked_slugs, labeled, ks),
+        "stages_ms": {stage: percentiles(samples) for stage, samples in stage_samples.items()},
+        "llm_stub_latency_ms": llm_latency_ms,
+        "llm_context": engine.context_builder.stats(),
+        "throughput": throughput,
+        "product_aggregation": engine.product_aggregation,
+        "reranker": engine.reranker.stats() if engine.reranker is not None else None,
+        "index": {
+            "type": getattr(engine.vector_store, "index_type", "flat") if engine.vector_store is not None else None,
+            "params": getattr(engine.vector_store, "index_params", {}) if engine.vector_store is not None else None,
+        },
+    }
+
+def benchmark_api(api_url, labeled, ks, levels, total_requests):
+    import requests
+
+    session = requests.Session()
+    url = f"{api_url.rstrip('/')}/recommend/batch"
+    k = max(ks)
+
+    def search(query):
+        response = session.post(url, json={"queries": [query], "k": k}, timeout=60)
+        response.raise_for_status()
+        return response.json()["results"][0]["assessments"]
+
+    print(f"Benchmarking API at {api_url}...")
+    latencies, ranked_slugs = [], {}
+    for query in labeled:
+        started = time.perf_counter()
+        assessments = search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        ranked_slugs[query] = unique_in_order(url_slug(item["url_slug"]) for item in assessments)
+
+    return {
+        "quality": quality_metrics(ranked_slugs, labeled, ks),
+        "latency_ms": percentiles(latencies),
+        "throughput": _throughput(search, list(labeled), levels, total_requests),
+    }
+
+def compare_to_baseline(report, baseline, recall_tolerance=0.01, latency_tolerance=0.25, min_delta_ms=1.0):
+    """
+    Returns human-readable regressions: a quality metric that dropped by more than
+    recall_tolerance, or a p95 stage latency that grew by more than latency_tolerance
+    (and by at least min_delta_ms, so sub-millisecond jitter is ignored).
+    """
+    regressions = []
+    for section in ("engine", "api"):
+        current, previous = report.get(section), baseline.get(section)
+        if not current or not previous:
+            continue
+        for metric, value in previous.get("quality", {}).items():
+            new_value = current["quality"].get(metric)
+            if new_value is not None and new_value < value - recall_tolerance:
+                regressions.append(f"{section} {metric}: {value} -> {new_value}")
+        stages = {**previous.get("stages_ms", {}), "latency": previous.get("latency_ms")}
+        current_stages = {**current.get("stages_ms", {}), "latency": current.get("latency_ms")}
+        for stage, values in stages.items():
+            if not values or not current_stages.get(stage) or not values.get("p95"):
+                continue
+            new_p95 = current_stages[stage]["p95"]
+            if new_p95 > values["p95"] * (1 + latency_tolerance) and new_p95 - values["p95"] >= min_delta_ms:
+                regressions.append(f"{section} {stage} p95: {values['p95']} ms -> {new_p95} ms")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the labeled queries and report quality, latency and throughput.")
+    parser.add_argument("--dataset", default=LABELED_QUERIES_PATH)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--repeats", type=int, default=5, help="Passes over the queries for stage latencies.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level.")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Delay of the stub LLM.")
+    parser.add_argument("--api-url", help="Also benchmark a running API, e.g. http://localhost:8000.")
+    parser.add_argument("--skip-engine", action="store_true", help="Only benchmark the API.")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="Keep the on-disk embedding cache enabled (off by default so embedding is measured).")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", help="Previous report; exit non-zero on quality or latency regressions.")
+    args = parser.parse_args()
+
+    if not args.embedding_cache:
+        os.environ["EMBEDDING_CACHE"] = "0"
+    # Stub answers must not be served from, or saved into, the persisted semantic cache.
+    os.environ["SEMANTIC_CACHE"] = "0"
+
+    labeled = load_labeled_queries(args.dataset)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "queries": len(labeled),
+        "k": args.k,
+    }
+    if not args.skip_engine:
+        report["engine"] = benchmark_engine(
+            labeled, args.k, args.repeats, args.concurrency, args.requests, args.llm_latency_ms
+        )
+    if args.api_url:
+        report["api"] = benchmark_api(args.api_url, labeled, args.k, args.concurrency, args.requests)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps({section: report[section]["quality"] for section in ("engine", "api") if section in report}, indent=2))
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_to_baseline(report, json.load(f))
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,134 @@
+"""
+A stand-in for the Gemini generateContent API, for exercising the LLM gateway (deadline,
+circuit breaker, hedging) without a real provider. Start it, then run the API with
+
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8790 ...
+
+Latency and failures can be changed while it runs with
+POST /admin/config {"latency_ms": 2000, "error_rate": 1.0}; GET /admin/config shows the
+current settings and request counts.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class FakeLLMState:
+    def __init__(self, latency_ms, slow_every, slow_ms, error_rate, error_status, answer):
+        self.settings = {
+            "latency_ms": latency_ms,
+            "slow_every": slow_every,
+            "slow_ms": slow_ms,
+            "error_rate": error_rate,
+            "error_status": error_status,
+            "answer": answer,
+        }
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def next_request(self):
+        """
+        Returns (delay in seconds, error status or None) for the next request.
+        """
+        with self.lock:
+            self.requests += 1
+            settings = dict(self.settings)
+            slow = settings["slow_every"] and self.requests % settings["slow_every"] == 0
+            failed = random.random() < settings["error_rate"]
+            if failed:
+                self.errors += 1
+        delay_ms = settings["slow_ms"] if slow else settings["latency_ms"]
+        return delay_ms / 1000, settings["error_status"] if failed else None
+
+    def snapshot(self):
+        with self.lock:
+            return {**self.settings, "requests": self.requests, "errors": self.errors}
+
+def _response(text):
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1, "totalTokenCount": 2},
+    }
+
+def make_handler(state):
+    class FakeLLMHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def do_GET(self):
+            if self.path == "/admin/config":
+                self._send(200, json.dumps(state.snapshot()).encode())
+            else:
+                self._send(404, b"{}")
+
+        def do_POST(self):
+            payload = self._read_json()
+            if self.path == "/admin/config":
+                with state.lock:
+                    state.settings.update({k: v for k, v in payload.items() if k in state.settings})
+                self._send(200, json.dumps(state.snapshot()).encode())
+                return
+            if ":generateContent" not in self.path and ":streamGenerateContent" not in self.path:
+                self._send(404, b"{}")
+                return
+
+            delay, error_status = state.next_request()
+            time.sleep(delay)
+            if error_status:
+                error = {"error": {"code": error_status, "message": "Injected failure from fake_llm_server",
+                                   "status": "RESOURCE_EXHAUSTED" if error_status == 429 else "UNAVAILABLE"}}
+                self._send(error_status, json.dumps(error).encode())
+                return
+
+            answer = state.settings["answer"]
+            if ":streamGenerateContent" in self.path:
+                # Server-sent events, one word per event, as with ?alt=sse.
+                words = answer.split(" ")
+                events = [
+                    b"data: " + json.dumps(_response(word + (" " if i < len(words) - 1 else ""))).encode() + b"\r\n\r\n"
+                    for i, word in enumerate(words)
+                ]
+                self._send(200, b"".join(events), content_type="text/event-stream")
+            else:
+                self._send(200, json.dumps(_response(answer)).encode())
+
+    return FakeLLMHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini generateContent API for gateway testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency-ms", type=float, default=50, help="Delay before every response.")
+    parser.add_argument("--slow-every", type=int, default=0, help="Make every Nth request slow (0 = never).")
+    parser.add_argument("--slow-ms", type=float, default=5000, help="Delay of the slow requests.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail.")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of failed requests (e.g. 429, 503).")
+    parser.add_argument("--answer", default="Fake recommendation from the local test server.")
+    args = parser.parse_args()
+
+    state = FakeLLMState(args.latency_ms, args.slow_every, args.slow_ms, args.error_rate, args.error_status, args.answer)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"Fake LLM server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,53 @@
-# Evaluation metrics
\ No newline at end of file
+# Evaluation metrics
+import os
+
+from src.config import DATA_DIR
+
+LABELED_QUERIES_PATH = os.path.join(DATA_DIR, "Gen_AI Dataset.xlsx")
+
+def url_slug(url):
+    """
+    Assessment slug of a catalog URL (or an existing slug), cleaned the way the scraper
+    names its files (data/scraping/scraper.py filename_for), which is where the catalog's
+    url_slug comes from: ".../view/sql-server-analysis-services-%28ssas%29/" gives
+    "sql-server-analysis-services-28ssas29".
+    """
+    slug = url.strip().strip("/").split("/")[-1]
+    return "".join(c for c in slug if c.isalnum() or c in ("-", "_")).strip()
+
+def load_labeled_queries(path=LABELED_QUERIES_PATH):
+    """
+    Returns {query: set of relevant assessment slugs} from the labeled dataset.
+    """
+    import pandas as pd
+
+    data = pd.read_excel(path).dropna(subset=["Query", "Assessment_url"])
+    labeled = {}
+    for query, url in zip(data["Query"], data["Assessment_url"]):
+        labeled.setdefault(query.strip(), set()).add(url_slug(url))
+    return labeled
+
+def recall_at_k(retrieved, relevant, k):
+    """
+    Fraction of the relevant items found among the first k retrieved (duplicates count once).
+    """
+    if not relevant:
+        return 0.0
+    return len(set(retrieved[:k]) & set(relevant)) / len(relevant)
+
+def average_precision_at_k(retrieved, relevant, k):
+    """
+    AP@k: mean of precision@i over the ranks i <= k holding a relevant item, normalized by
+    min(k, number of relevant items).
+    """
+    if not relevant:
+        return 0.0
+    hits, total = 0, 0.0
+    for rank, item in enumerate(retrieved[:k], 1):
+        if item in relevant:
+            hits += 1
+            total += hits / rank
+    return total / min(k, len(relevant))
+
+def unique_in_order(items):
+    return list(dict.fromkeys(items))
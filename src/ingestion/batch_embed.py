@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from src.embeddings.embedder import get_embedding_model, get_embedding_model_name, is_remote_backend
+from src.rag.errors import is_rate_limit_error
+from src.utils.metrics import RATE_LIMIT_ERRORS
+
+_worker_embeddings = None
+
+def _init_worker(backend):
+    global _worker_embeddings
+    _worker_embeddings = get_embedding_model(backend)
+
+def _embed_in_worker(batch_no, texts):
+    return batch_no, np.asarray(_worker_embeddings.embed_documents(texts), dtype=np.float32)
+
+def _embed_with_backoff(embeddings, texts, max_retries=5):
+    for retry_count in range(max_retries):
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+            RATE_LIMIT_ERRORS.labels("embedding").inc()
+            wait_time = (2 ** retry_count) * 5
+            print(f"Rate limit hit. Waiting {wait_time} seconds...")
+            time.sleep(wait_time)
+    raise RuntimeError("Max retries exceeded while embedding batch.")
+
+def _fingerprint(texts, model_name, batch_size):
+    digest = hashlib.sha256(f"{model_name}\0{batch_size}".encode("utf-8"))
+    for text in texts:
+        digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+    return digest.hexdigest()
+
+def _batch_path(checkpoint_dir, batch_no):
+    return os.path.join(checkpoint_dir, f"batch_{batch_no:06d}.npy")
+
+def _prepare_checkpoint(checkpoint_dir, fingerprint):
+    """
+    Reuses checkpoint_dir if it belongs to the same corpus, otherwise starts it afresh.
+    """
+    manifest_path = os.path.join(checkpoint_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get("fingerprint") == fingerprint:
+                return
+        print("Checkpoint belongs to a different corpus. Discarding it.")
+        shutil.rmtree(checkpoint_dir)
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"fingerprint": fingerprint}, f)
+
+def _save_batch(checkpoint_dir, batch_no, vectors):
+    path = _batch_path(checkpoint_dir, batch_no)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, vectors)
+    os.replace(tmp_path, path)
+
+def embed_texts_in_batches(texts, embeddings=None, backend=None, batch_size=256, workers=0, checkpoint_dir=None):
+    """
+    Embeds texts in batches of batch_size and returns a float32 matrix with one row per text.
+
+    With workers > 1 the batches are spread across a process pool, each worker loading its
+    own copy of the model. Finished batches are written to checkpoint_dir so that an
+    interrupted run picks up where it stopped. Remote embedders always run sequentially
+    with exponential backoff on rate-limit errors.
+    """
+    remote = is_remote_backend(backend)
+    if remote and workers > 1:
+        print("Remote embedder configured; ignoring worker pool.")
+        workers = 0
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results = {}
+
+    if checkpoint_dir:
+        fingerprint = _fingerprint(texts, get_embedding_model_name(backend), batch_size)
+        _prepare_checkpoint(checkpoint_dir, fingerprint)
+        for batch_no in range(len(batches)):
+            path = _batch_path(checkpoint_dir, batch_no)
+            if os.path.exists(path):
+                results[batch_no] = np.load(path)
+        if results:
+            print(f"Resuming from checkpoint: {len(results)}/{len(batches)} batches already embedded.")
+
+    pending = [batch_no for batch_no in range(len(batches)) if batch_no not in results]
+
+    def _collect(batch_no, vectors):
+        results[batch_no] = vectors
+        if checkpoint_dir:
+            _save_batch(checkpoint_dir, batch_no, vectors)
+        print(f"Embedded batch {len(results)}/{len(batches)} ({len(batches[batch_no])} chunks).")
+
+    if pending and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(backend,)) as pool:
+            futures = [pool.submit(_embed_in_worker, batch_no, batches[batch_no]) for batch_no in pending]
+            for future in as_completed(futures):
+                _collect(*future.result())
+    elif pending:
+        if embeddings is None:
+            embeddings = get_embedding_model(backend)
+        for batch_no in pending:
+            if remote:
+                vectors = _embed_with_backoff(embeddings, batches[batch_no])
+            else:
+                vectors = embeddings.embed_documents(batches[batch_no])
+            _collect(batch_no, np.asarray(vectors, dtype=np.float32))
+
+    if not batches:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack([results[batch_no] for batch_no in range(len(batches))])
+
+def clear_checkpoint(checkpoint_dir):
+    if checkpoint_dir and os.path.exists(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
@@ -1,88 +1,239 @@
+import argparse
+import hashlib
 import json
 import os
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from src.config import PARSED_DATA_PATH, DATA_DIR
-from src.embeddings.embedder import get_embedding_model
-from src.vector_store.faiss_index import create_faiss_index, save_faiss_index
-from src.utils.text import create_documents
+from src.config import (
+    PARSED_DATA_PATH, LEGACY_PARSED_DATA_PATH, FAISS_INDEX_DIR, INGEST_CHECKPOINT_DIR, EMBED_BATCH_SIZE, EMBED_WORKERS, FAISS_INDEX_TYPE
+)
+from src.embeddings.embedder import get_embedding_model, get_embedding_backend, get_embedding_model_name
+from src.ingestion.batch_embed import embed_texts_in_batches, clear_checkpoint
+from src.vector_store.faiss_index import (
+    create_faiss_index_from_vectors, save_faiss_index, load_faiss_index, load_index_file, texts_in_row_order,
+    MANIFEST_FILE, INDEX_TYPES
+)
+from src.vector_store.bm25_index import BM25Index, BM25_FILE
+from src.vector_store.metadata_store import MetadataStore, METADATA_FILE
+from src.utils.metadata import extract_assessment_metadata, load_links_data
+from src.utils.text import create_documents, split_sentences, find_boilerplate, BOILERPLATE_FILE
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def ingest_data():
-    print("Loading parsed data...")
-    if not os.path.exists(PARSED_DATA_PATH):
-        print(f"Error: {PARSED_DATA_PATH} not found. Run parser first.")
-        return
+CHUNK_MANIFEST = "chunks.json"
 
-    with open(PARSED_DATA_PATH, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    print(f"Loaded {len(data)} items.")
-    
-    raw_documents = create_documents(data)
-    
-    print("Splitting text...")
+def iter_catalog(path):
+    """
+    Yields the parsed product records one at a time from the parser's JSON Lines output,
+    or from a catalog in the legacy single-array JSON format.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".json"):
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                record.pop("html_sha256", None)  # parser bookkeeping, not product metadata
+                yield record
+
+def load_catalog(path):
+    """
+    Streams the catalog, splitting each product into chunks and extracting its card fields
+    as it is read, so the raw corpus is never held in memory as a whole.
+    Returns (chunks, {product: card fields}, boilerplate sentences, number of products read).
+    """
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200
     )
-    documents = text_splitter.split_documents(raw_documents)
+    links_data = load_links_data()
+    documents, product_metadata, sentence_counts, count = [], {}, {}, 0
+    for item in iter_catalog(path):
+        count += 1
+        if not item.get('content'):
+            continue
+        documents.extend(text_splitter.split_documents(create_documents([item])))
+        source = item.get('url_slug') or item.get('filename', '')
+        product_metadata[source] = extract_assessment_metadata(
+            item['content'], item.get('url_slug', ''), item.get('title', ''), links_data
+        )
+        for sentence in set(split_sentences(item['content'])):
+            sentence_counts[sentence] = sentence_counts.get(sentence, 0) + 1
+    return documents, product_metadata, find_boilerplate(sentence_counts, len(product_metadata)), count
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def assign_chunk_ids(documents):
+    """
+    Gives every chunk a stable ID derived from its product and content hash, so an
+    unchanged chunk keeps the same ID across runs. Returns {chunk_id: manifest entry}.
+    """
+    manifest = {}
+    for doc in documents:
+        source = doc.metadata.get('url_slug') or doc.metadata.get('filename', '')
+        digest = content_hash(doc.page_content)
+        chunk_id = f"{source}:{digest[:16]}"
+        occurrence = 1
+        while chunk_id in manifest:
+            occurrence += 1
+            chunk_id = f"{source}:{digest[:16]}:{occurrence}"
+        doc.id = chunk_id
+        manifest[chunk_id] = {"source": source, "hash": digest}
+    return manifest
+
+def build_metadata_store(product_metadata, chunk_manifest):
+    """
+    Maps every chunk ID to its product's structured card fields so the API and UI can look them up.
+    """
+    doc_products = {chunk_id: entry["source"] for chunk_id, entry in chunk_manifest.items()}
+    return MetadataStore.build(product_metadata, doc_products)
+
+def _embed(documents, embeddings, backend, batch_size, workers, checkpoint_dir):
+    return embed_texts_in_batches(
+        [doc.page_content for doc in documents],
+        embeddings=embeddings,
+        backend=backend,
+        batch_size=batch_size,
+        workers=workers,
+        checkpoint_dir=checkpoint_dir
+    )
+
+def _load_previous_index(embeddings, model_name):
+    previous = load_index_file(FAISS_INDEX_DIR, CHUNK_MANIFEST)
+    if not previous or previous.get("model") != model_name:
+        return None, None
+    try:
+        vector_store = load_faiss_index(FAISS_INDEX_DIR, embeddings, writable=True)
+    except Exception as e:
+        print(f"Could not load existing index ({e}).")
+        return None, None
+    return vector_store, previous["chunks"]
+
+def _index_settings(index_type):
+    """
+    Returns (index_type, params) for the next build: the existing index's type and tuned
+    parameters unless a different type was asked for, in which case defaults apply.
+    """
+    manifest = load_index_file(FAISS_INDEX_DIR, MANIFEST_FILE) or {}
+    previous_type = manifest.get("index_type", "flat")
+    if index_type is None or index_type == previous_type:
+        return previous_type, manifest.get("index_params", {})
+    return index_type, None
+
+def ingest_data(batch_size=EMBED_BATCH_SIZE, workers=EMBED_WORKERS, resume=True, incremental=False,
+                index_type=FAISS_INDEX_TYPE):
+    print("Loading and splitting parsed data...")
+    catalog_path = PARSED_DATA_PATH if os.path.exists(PARSED_DATA_PATH) else LEGACY_PARSED_DATA_PATH
+    if not os.path.exists(catalog_path):
+        print(f"Error: {PARSED_DATA_PATH} not found. Run parser first.")
+        return
+
+    documents, product_metadata, boilerplate, count = load_catalog(catalog_path)
+    print(f"Loaded {count} items from {os.path.basename(catalog_path)}.")
+    chunk_manifest = assign_chunk_ids(documents)
     print(f"Created {len(documents)} document chunks.")
-    
+    metadata_payload = build_metadata_store(product_metadata, chunk_manifest).to_payload()
+    # Sentences repeated across many products; left out of the LLM context at query time.
+    boilerplate_payload = {"sentences": boilerplate}
+    print(f"Found {len(boilerplate)} boilerplate sentences.")
+
     print("Initializing embedding model...")
+    backend = get_embedding_backend()
+    model_name = get_embedding_model_name(backend)
     try:
-        embeddings = get_embedding_model()
+        embeddings = get_embedding_model(backend)
     except Exception as e:
         print(f"Error initializing embeddings: {e}")
         return
 
-    print("Creating FAISS index with batching (this may take a while)...")
-    import time
-    
-    batch_size = 2
-    delay = 10
-    
-    vector_store = None
-    
+    index_type, index_params = _index_settings(index_type)
+    vector_store, previous_chunks = None, None
+    if incremental:
+        vector_store, previous_chunks = _load_previous_index(embeddings, model_name)
+        if vector_store is None:
+            print("No compatible index with a chunk manifest found; doing a full rebuild.")
+
+    checkpoint_dir = INGEST_CHECKPOINT_DIR if resume else None
     try:
-        total_docs = len(documents)
-        for i in range(0, total_docs, batch_size):
-            batch = documents[i:i+batch_size]
-            print(f"Processing batch {i//batch_size + 1}/{(total_docs + batch_size - 1)//batch_size} ({len(batch)} docs)...")
-            
-            retry_count = 0
-            max_retries = 5
-            while retry_count < max_retries:
-                try:
-                    if vector_store is None:
-                        vector_store = create_faiss_index(batch, embeddings)
-                    else:
-                        vector_store.add_documents(batch)
-                    break
-                except Exception as e:
-                    if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
-                        wait_time = (2 ** retry_count) * 5
-                        print(f"Rate limit hit. Waiting {wait_time} seconds...")
-                        time.sleep(wait_time)
-                        retry_count += 1
-                    else:
-                        raise e
-            
-            if retry_count == max_retries:
-                print("Max retries exceeded. Aborting.")
+        if vector_store is not None:
+            new_documents = [doc for doc in documents if doc.id not in previous_chunks]
+            stale_ids = [chunk_id for chunk_id in previous_chunks if chunk_id not in chunk_manifest]
+            print(f"Incremental update: {len(new_documents)} new/changed chunks, {len(stale_ids)} stale chunks.")
+
+            sidecars_current = (
+                load_index_file(FAISS_INDEX_DIR, METADATA_FILE) == metadata_payload
+                and load_index_file(FAISS_INDEX_DIR, BOILERPLATE_FILE) == boilerplate_payload
+                and os.path.exists(os.path.join(FAISS_INDEX_DIR, BM25_FILE))
+                and os.path.exists(os.path.join(FAISS_INDEX_DIR, MANIFEST_FILE))
+                and getattr(vector_store, "index_type", "flat") == index_type
+            )
+            if not new_documents and not stale_ids and sidecars_current:
+                print("Index is already up to date.")
                 return
 
-            if i + batch_size < total_docs:
-                time.sleep(delay)
-        
-        index_path = os.path.join(DATA_DIR, "faiss_index")
-        save_faiss_index(vector_store, index_path)
-        print(f"Successfully saved FAISS index to {index_path}")
-        
+            if index_params is None:
+                vector_store.index_type, vector_store.index_params = index_type, {}
+            if stale_ids:
+                vector_store.delete(stale_ids)
+            if new_documents:
+                vectors = _embed(new_documents, embeddings, backend, batch_size, workers, checkpoint_dir)
+                vector_store.add_embeddings(
+                    zip([doc.page_content for doc in new_documents], vectors),
+                    metadatas=[doc.metadata for doc in new_documents],
+                    ids=[doc.id for doc in new_documents]
+                )
+        else:
+            print(f"Embedding chunks in batches of {batch_size}...")
+            vectors = _embed(documents, embeddings, backend, batch_size, workers, checkpoint_dir)
+            print(f"Creating {index_type} FAISS index...")
+            vector_store = create_faiss_index_from_vectors(
+                documents, vectors, embeddings, ids=[doc.id for doc in documents],
+                index_type=index_type, index_params=index_params
+            )
+    except Exception as e:
+        print(f"Error embedding documents: {e}")
+        print("Progress so far is checkpointed; re-run to resume.")
+        return
+
+    try:
+        print("Building BM25 index...")
+        bm25_index = BM25Index.build(texts_in_row_order(vector_store))
+        save_faiss_index(
+            vector_store,
+            FAISS_INDEX_DIR,
+            extra_files={
+                CHUNK_MANIFEST: {"model": model_name, "chunks": chunk_manifest},
+                METADATA_FILE: metadata_payload,
+                BOILERPLATE_FILE: boilerplate_payload,
+                BM25_FILE: bm25_index.save
+            }
+        )
+        print(f"Successfully saved FAISS index to {FAISS_INDEX_DIR}")
+        clear_checkpoint(checkpoint_dir)
+        if hasattr(embeddings, "stats"):
+            print(f"Embedding cache: {embeddings.stats()}")
+
     except Exception as e:
         print(f"Error creating/saving index: {e}")
 
 if __name__ == "__main__":
-    ingest_data()
+    parser = argparse.ArgumentParser(description="Embed the parsed SHL catalog into a FAISS index.")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=EMBED_WORKERS)
+    parser.add_argument("--no-resume", action="store_true", help="Ignore and do not write checkpoints.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed new or changed chunks and drop chunks of removed products.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=FAISS_INDEX_TYPE,
+                        help="FAISS index type; defaults to the existing index's type (flat on a first build).")
+    args = parser.parse_args()
+
+    ingest_data(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        resume=not args.no_resume,
+        incremental=args.incremental,
+        index_type=args.index_type
+    )
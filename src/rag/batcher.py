@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from src.utils.metrics import MICRO_BATCH_SIZE, MICRO_BATCH_QUEUE_WAIT
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+class MicroBatcher:
+    """
+    Collects work items submitted from many threads and runs them in batches on one worker
+    thread. A batch closes when max_batch_size items are waiting or max_wait_ms has passed
+    since its first item arrived; items are grouped by key and run_batch(key, items) is
+    called once per group, returning one result per item.
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=2.0, name="micro-batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.batch_size_counts = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS + (float("inf"),)}
+        self.queue_wait_total = 0.0
+        self._recent_waits = deque(maxlen=1024)
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, key, item):
+        """
+        Queues item and returns a concurrent.futures.Future for its result.
+        """
+        future = Future()
+        self._queue.put((key, item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, key, item, timeout=None):
+        return self.submit(key, item).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Anything already queued rides along for free.
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _record(self, batch, started):
+        waits = [started - submitted for _, _, _, submitted in batch]
+        bucket = next(b for b in self.batch_size_counts if len(batch) <= b)
+        with self._lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self.batch_size_counts[bucket] += 1
+            self.queue_wait_total += sum(waits)
+            self._recent_waits.extend(waits)
+        MICRO_BATCH_SIZE.observe(len(batch))
+        for wait in waits:
+            MICRO_BATCH_QUEUE_WAIT.observe(wait)
+
+    def _run(self):
+        while True:
+            # Items whose caller gave up (e.g. a cancelled asyncio task) are dropped; the rest
+            # can no longer be cancelled, so setting their result cannot fail.
+            batch = [entry for entry in self._collect() if entry[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            self._record(batch, started)
+
+            groups = {}
+            for key, item, future, _ in batch:
+                groups.setdefault(key, []).append((item, future))
+            for key, entries in groups.items():
+                try:
+                    results = self.run_batch(key, [item for item, _ in entries])
+                except Exception as e:
+                    for _, future in entries:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(entries, results):
+                    future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            percentile = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 3) if waits else 0.0
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "batch_size_histogram": {f"<={bucket}": count for bucket, count in self.batch_size_counts.items()},
+                "mean_queue_wait_ms": round(self.queue_wait_total / self.items * 1000, 3) if self.items else 0.0,
+                "p50_queue_wait_ms": percentile(0.50),
+                "p95_queue_wait_ms": percentile(0.95),
+            }
@@ -0,0 +1,158 @@
+import re
+import threading
+
+from src.utils.metadata import TEST_TYPE_LABELS, clean_title, test_type_codes, yes_no
+from src.utils.metrics import CONTEXT_TOKENS
+from src.utils.text import split_sentences
+
+# Parts of the page text that the card-field header already states, plus the trailing
+# downloads list (fact sheets and sample reports per language) that follows Remote Testing.
+PAGE_FIELD_PATTERNS = [
+    re.compile(r"\s*Assessment length Approximate Completion Time in minutes = (?:max )?\d+"),
+    re.compile(r"\s*Test Type:(?:\s+[A-Z](?![\w/]))+"),
+    re.compile(r"\s*Remote Testing:.*$"),
+]
+
+class TokenCounter:
+    """
+    Counts tokens with tiktoken. Gemini tokenizes differently, so counts are an estimate
+    used for budgeting; if the encoding cannot be loaded (it is downloaded on first use),
+    characters / 4 is used instead.
+    """
+
+    def __init__(self, encoding_name="cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+
+    def _get_encoding(self):
+        # Loaded on first use, so engines that never call the LLM never fetch the encoding.
+        if not self._loaded:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                print(f"tiktoken encoding {self.encoding_name} unavailable ({e}); estimating tokens from length.")
+            self._loaded = True
+        return self._encoding
+
+    def count(self, text):
+        encoding = self._get_encoding()
+        if encoding is None:
+            return -(-len(text) // 4)
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def truncate(self, text, max_tokens):
+        if max_tokens <= 0:
+            return ""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return text[:max_tokens * 4]
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+
+class ContextBuilder:
+    """
+    Packs retrieved chunks into the LLM context, most relevant first, up to max_tokens.
+
+    Each chunk is preceded by its assessment's card fields (test types, duration, remote,
+    adaptive), which replace the same fields and the downloads list in the page text, and
+    is stripped of boilerplate sentences shared across the catalog and of sentences already
+    sent for an earlier chunk. The chunk that crosses the budget is cut
+    to fit; later ones are dropped. build() also reports the tokens saved compared with
+    joining the raw chunks.
+    """
+
+    def __init__(self, max_tokens=1200, counter=None, boilerplate=None, min_chunk_tokens=48):
+        self.max_tokens = max_tokens
+        self.counter = counter or TokenCounter()
+        self.boilerplate = set(boilerplate or ())
+        self.min_chunk_tokens = min_chunk_tokens
+        self._lock = threading.Lock()
+        self._totals = {"requests": 0, "raw_tokens": 0, "context_tokens": 0, "tokens_saved": 0, "docs_dropped": 0}
+
+    def _title(self, doc, metadata):
+        return (metadata or {}).get("title") or clean_title(doc.metadata.get("title", "Unknown Title"))
+
+    def _header(self, rank, title, metadata):
+        metadata = metadata or {}
+        fields = []
+        codes = sorted(test_type_codes(metadata.get("test_type")))
+        if codes:
+            fields.append("Test types: " + ", ".join(TEST_TYPE_LABELS[code] for code in codes))
+        if metadata.get("duration_minutes") is not None:
+            fields.append(f"Duration: {metadata['duration_minutes']} min")
+        for field in ("remote", "adaptive"):
+            value = yes_no(metadata.get(field))
+            if value is not None:
+                fields.append(f"{field.capitalize()}: {'yes' if value else 'no'}")
+        header = f"[{rank}] {title}"
+        return header + ("\n" + " | ".join(fields) if fields else "")
+
+    def _clean(self, text, title, seen):
+        if text.startswith(title):
+            text = text[len(title):].lstrip()
+        for pattern in PAGE_FIELD_PATTERNS:
+            text = pattern.sub("", text)
+        text = text.rstrip(" ,")
+        kept = []
+        for sentence in split_sentences(text):
+            if sentence in self.boilerplate or sentence in seen:
+                continue
+            seen.add(sentence)
+            kept.append(sentence)
+        return " ".join(kept)
+
+    def build(self, docs, metadata=None):
+        """
+        Returns (context text, report) for docs in relevance order; metadata holds the card
+        fields of each doc (or None).
+        """
+        metadata = metadata or [None] * len(docs)
+        count = self.counter.count
+        separator_tokens = count("\n\n")
+        entries, used, seen = [], 0, set()
+        for rank, (doc, fields) in enumerate(zip(docs, metadata), 1):
+            title = self._title(doc, fields)
+            header = self._header(rank, title, fields)
+            text = self._clean(doc.page_content, title, seen)
+            entry = f"{header}\n{text}" if text else header
+            cost = count(entry) + (separator_tokens if entries else 0)
+            if used + cost <= self.max_tokens:
+                entries.append(entry)
+                used += cost
+                continue
+            # Cut the first chunk that does not fit, unless too little of it would remain.
+            room = self.max_tokens - used - count(header) - 2 * separator_tokens
+            if room >= self.min_chunk_tokens or not entries:
+                entries.append(f"{header}\n{self.counter.truncate(text, room)}".rstrip())
+            break
+
+        context = "\n\n".join(entries)
+        raw_tokens = count("\n\n".join(doc.page_content for doc in docs))
+        context_tokens = count(context)
+        report = {
+            "raw_tokens": raw_tokens,
+            "context_tokens": context_tokens,
+            "tokens_saved": raw_tokens - context_tokens,
+            "docs_packed": len(entries),
+            "docs_dropped": len(docs) - len(entries),
+        }
+        self._record(report)
+        return context, report
+
+    def _record(self, report):
+        with self._lock:
+            self._totals["requests"] += 1
+            for key in ("raw_tokens", "context_tokens", "tokens_saved", "docs_dropped"):
+                self._totals[key] += report[key]
+        CONTEXT_TOKENS.labels("sent").observe(report["context_tokens"])
+        CONTEXT_TOKENS.labels("saved").observe(max(0, report["tokens_saved"]))
+
+    def stats(self):
+        with self._lock:
+            totals = dict(self._totals)
+        requests = totals["requests"] or 1
+        totals["mean_tokens_saved"] = round(totals["tokens_saved"] / requests, 1)
+        totals["max_tokens"] = self.max_tokens
+        return totals
@@ -1,91 +1,836 @@
-from langchain_community.vectorstores import FAISS
-from src.embeddings.embedder import get_embedding_model
-from langchain_google_genai import ChatGoogleGenerativeAI
+from src.embeddings.embedder import get_embedding_model, get_embedding_model_name, embed_queries
+from src.vector_store.faiss_index import load_faiss_index, load_index_file, load_docstore, search_parameters, search_index
+from src.vector_store.metadata_store import MetadataStore, METADATA_FILE
+from src.vector_store.filters import FilterIndex, normalize_filters
+from src.vector_store.bm25_index import BM25Index, fused_scores
+from src.vector_store.products import aggregate_by_product, AGGREGATIONS
+from src.utils.metadata import extract_assessment_metadata
+from src.rag.batcher import MicroBatcher
+from src.rag.cache import TTLCache
+from src.rag.semantic_cache import SemanticCache
+from src.rag.context import ContextBuilder, TokenCounter
+from src.rag.reranker import CrossEncoderReranker, DEFAULT_RERANK_MODEL
+from src.rag.errors import EngineOverloadedError, CircuitOpenError, is_rate_limit_error
+from src.rag.llm_gateway import CircuitBreaker, LLMGateway
+from src.service.client import SearchServiceClient
+from src.utils.text import normalize_query, BOILERPLATE_FILE
+from src.config import DATA_DIR
+from src.utils.timing import StageTimer
+from src.utils.metrics import span, LLM_CALLS, LLM_FALLBACKS, RATE_LIMIT_ERRORS, OVERLOAD_REJECTIONS
+from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import faiss
+import textwrap
+import numpy as np
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Bump whenever the prompt changes so cached recommendations from the old prompt are not served.
+PROMPT_VERSION = "2"
+
+PROMPT_TEMPLATE = textwrap.dedent("""\
+    You are an expert consultant for SHL, a global leader in talent acquisition and management.
+    Your goal is to recommend the best assessments based on the user's needs.
+
+    Use the following context (details about SHL assessments) to answer the user's request.
+    If the answer is not in the context, say you don't have enough information.
+
+    Context:
+    {context}
+
+    User Request: {query}
+
+    Recommendation:
+    """)
+
+class IndexSnapshot:
+    """
+    Everything derived from one version of the index on disk. The engine swaps the whole
+    snapshot at once on reload, and each search reads a single snapshot throughout, so FAISS
+    rows are never resolved against another version's filters, BM25 rows or docstore IDs.
+    """
+
+    def __init__(self, vector_store, docstore, metadata, filter_index, bm25_index, boilerplate, mtime):
+        self.vector_store = vector_store
+        self.docstore = docstore
+        self.metadata = metadata
+        self.filter_index = filter_index
+        self.bm25_index = bm25_index
+        self.boilerplate = boilerplate
+        self.mtime = mtime
+
 class AssessmentRecommendationEngine:
-    def __init__(self, index_path="data/faiss_index"):
-        self.embeddings = get_embedding_model()
-        try:
-            self.vector_store = FAISS.load_local(
-                index_path, 
-                self.embeddings,
-                allow_dangerous_deserialization=True
+    def __init__(self, index_path="data/faiss_index", search_service_socket=None):
+        self.index_path = index_path
+
+        # With a search service, embedding and FAISS search happen in that one process and
+        # this engine only keeps the docstore, metadata and LLM (see src/service/search_service.py).
+        search_service_socket = search_service_socket or os.getenv("SEARCH_SERVICE_SOCKET")
+        if search_service_socket:
+            self.search_client = SearchServiceClient(
+                search_service_socket, timeout=float(os.getenv("SEARCH_SERVICE_TIMEOUT", "10"))
             )
+            self.embeddings = None
+        else:
+            self.search_client = None
+            self.embeddings = get_embedding_model()
+
+        cache_ttl = float(os.getenv("RESULT_CACHE_TTL", "600"))
+        cache_entries = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+        cache_bytes = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        # normalized query -> retrieved doc IDs
+        self.retrieval_cache = TTLCache(max_entries=cache_entries, ttl=cache_ttl, max_bytes=cache_bytes // 4, name="retrieval")
+        # (normalized query, doc IDs, prompt version) -> generated recommendation
+        self.response_cache = TTLCache(max_entries=cache_entries, ttl=cache_ttl, max_bytes=cache_bytes, name="response")
+        # normalized query -> embedding from the last search, reused by the semantic cache
+        self.query_vectors = TTLCache(max_entries=cache_entries, ttl=cache_ttl, name="query_vector")
+
+        # LLM context: retrieved chunks and their card fields packed into CONTEXT_MAX_TOKENS,
+        # without the boilerplate sentences found at ingestion time.
+        self.context_builder = ContextBuilder(
+            max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "1200")),
+            counter=TokenCounter(os.getenv("CONTEXT_TOKEN_ENCODING", "cl100k_base"))
+        )
+        self._chain = None
+
+        self._snapshot = None
+        self._reload_lock = threading.Lock()
+        try:
+            self.reload_index()
             print(f"Loaded FAISS index from {index_path}")
         except Exception as e:
             print(f"Error loading FAISS index: {e}")
             raise
 
+        # Async path: CPU-bound work around the search (docstore, rerank, semantic cache; the
+        # whole retrieval if micro-batching is off) runs in a bounded thread pool, and at most
+        # max_concurrent_llm_calls generations are in flight; the rest queue for up to
+        # queue_timeout seconds before being rejected.
+        self.search_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SEARCH_WORKERS", str(min(8, os.cpu_count() or 1)))),
+            thread_name_prefix="search"
+        )
+        self.max_concurrent_llm_calls = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "256"))
+        self.queue_timeout = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT", "30"))
+        self.batch_llm_concurrency = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+        self._llm_slots = None
+        # Every LLM call goes through the gateway: a circuit breaker that sends requests
+        # straight to the fallback while the provider keeps failing, the LLM_TIMEOUT
+        # deadline, and (if LLM_HEDGE_AFTER_MS > 0) a second request when the first is slow.
+        self.llm_gateway = LLMGateway(
+            timeout=self.llm_timeout,
+            hedge_after_ms=float(os.getenv("LLM_HEDGE_AFTER_MS", "0")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+            ),
+            max_workers=int(os.getenv("LLM_GATEWAY_WORKERS", "32"))
+        )
+
+        # Hybrid retrieval: dense and BM25 candidates are fused with reciprocal rank fusion.
+        self.hybrid_search = os.getenv("HYBRID_SEARCH", "1") != "0"
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", "50"))
+        self.exact_filter_max_rows = int(os.getenv("EXACT_FILTER_MAX_ROWS", "20000"))
+
+        # Product-level results: chunk scores are aggregated per assessment (max or sum) and
+        # k distinct assessments are returned, each by its best chunk. Searches over-fetch
+        # k * product_overfetch chunks and double that until k products are found.
+        # PRODUCT_AGGREGATION=none returns raw chunks.
+        aggregation = os.getenv("PRODUCT_AGGREGATION", "max").lower()
+        if aggregation not in AGGREGATIONS + ("none",):
+            raise ValueError(f"PRODUCT_AGGREGATION must be one of {AGGREGATIONS + ('none',)}, not {aggregation!r}")
+        self.product_aggregation = None if aggregation == "none" else aggregation
+        self.product_overfetch = int(os.getenv("PRODUCT_OVERFETCH", "3"))
+
+        # Optional cross-encoder rerank: retrieve rerank_candidates dense results, rescore them
+        # and keep the best k, falling back to the dense order past RERANK_BUDGET_MS.
+        if os.getenv("RERANK", "0") != "0":
+            self.reranker = CrossEncoderReranker(
+                model_name=os.getenv("RERANK_MODEL", DEFAULT_RERANK_MODEL),
+                budget_ms=float(os.getenv("RERANK_BUDGET_MS", "150")),
+                cache_entries=int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "50000")),
+                cache_ttl=cache_ttl
+            )
+        else:
+            self.reranker = None
+        self.rerank_candidates = int(os.getenv("RERANK_CANDIDATES", "20"))
+        # Chunks passed to the LLM as context.
+        self.answer_docs = int(os.getenv("ANSWER_CONTEXT_DOCS", "4"))
+
+        # Single-query retrievals from concurrent requests are coalesced into one embedding
+        # call and one FAISS search.
+        if os.getenv("MICRO_BATCH", "1") != "0":
+            self.micro_batcher = MicroBatcher(
+                self._run_micro_batch,
+                max_batch_size=int(os.getenv("MICRO_BATCH_MAX_SIZE", "32")),
+                max_wait_ms=float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "2")),
+                name="search-batcher"
+            )
+        else:
+            self.micro_batcher = None
+
         api_key = os.getenv("GEMINI_API_KEY")
         if api_key:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            # Retries stay low so the gateway's deadline and breaker see failures promptly;
+            # GEMINI_BASE_URL can point at src/evaluation/fake_llm_server.py for testing.
             self.llm = ChatGoogleGenerativeAI(
                 model="gemini-2.0-flash",
                 google_api_key=api_key,
-                temperature=0.3
+                temperature=0.3,
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "1")),
+                timeout=self.llm_timeout,
+                base_url=os.getenv("GEMINI_BASE_URL") or None
             )
         else:
             print("Warning: GEMINI_API_KEY not found. LLM features will be disabled.")
             self.llm = None
 
-    def search(self, query, k=3):
-        docs = self.vector_store.similarity_search(query, k=k)
+        # Answers reused across paraphrases: a response-cache miss looks for an earlier query
+        # within SEMANTIC_CACHE_THRESHOLD cosine that retrieved the same documents. Needs the
+        # local embedder, so it is off when searching through the search service.
+        self.semantic_cache = None
+        if self.llm is not None and self.embeddings is not None and os.getenv("SEMANTIC_CACHE", "1") != "0":
+            self.semantic_cache = SemanticCache(
+                path=os.getenv("SEMANTIC_CACHE_PATH", os.path.join(DATA_DIR, ".semantic_cache.npz")) or None,
+                model_name=get_embedding_model_name(),
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+                max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+                ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "86400")),
+                save_interval=float(os.getenv("SEMANTIC_CACHE_SAVE_SECONDS", "60"))
+            )
+
+    def warm_up(self):
+        """
+        Runs one throwaway search so model weights and index pages are loaded before real traffic.
+        """
+        if self.search_client is not None:
+            return
+        self.search("assessment", k=1)
+        self.retrieval_cache.clear()
+        if self.reranker is not None:
+            self.reranker.score_cache.clear()
+
+    def _index_mtime(self):
+        try:
+            return os.path.getmtime(os.path.join(self.index_path, "index.faiss"))
+        except OSError:
+            return None
+
+    def _load_snapshot(self):
+        mtime = self._index_mtime()
+        metadata = MetadataStore.from_payload(load_index_file(self.index_path, METADATA_FILE))
+        boilerplate = set((load_index_file(self.index_path, BOILERPLATE_FILE) or {}).get("sentences", []))
+        if self.search_client is not None:
+            return IndexSnapshot(None, load_docstore(self.index_path), metadata, None, None, boilerplate, mtime)
+        vector_store = load_faiss_index(self.index_path, self.embeddings)
+        if not len(metadata):
+            metadata = self._metadata_from_docstore(vector_store)
+        return IndexSnapshot(
+            vector_store,
+            vector_store.docstore,
+            metadata,
+            FilterIndex(metadata, vector_store.index_to_docstore_id),
+            BM25Index.load(self.index_path),
+            boilerplate,
+            mtime
+        )
+
+    def reload_index(self):
+        """
+        (Re)loads the FAISS index from disk and drops every cached result derived from the old one.
+        Searches keep using the previous snapshot until the new one is fully loaded.
+        """
+        with self._reload_lock:
+            self._swap_snapshot(self._load_snapshot())
+
+    def _swap_snapshot(self, snapshot):
+        self._snapshot = snapshot
+        self.context_builder.boilerplate = snapshot.boilerplate
+        self.retrieval_cache.clear()
+        self.response_cache.clear()
+
+    def _index_changed(self):
+        # A missing index file means it is being replaced; keep serving the loaded one.
+        mtime = self._index_mtime()
+        return mtime is not None and mtime != self._snapshot.mtime
+
+    def reload_index_if_changed(self):
+        if not self._index_changed():
+            return
+        with self._reload_lock:
+            # Another thread may have reloaded while this one waited for the lock.
+            if not self._index_changed():
+                return
+            print(f"Index at {self.index_path} changed on disk; reloading.")
+            self._swap_snapshot(self._load_snapshot())
+
+    # Read-only views of the current snapshot.
+    @property
+    def vector_store(self):
+        return self._snapshot.vector_store
+
+    @property
+    def docstore(self):
+        return self._snapshot.docstore
+
+    @property
+    def metadata(self):
+        return self._snapshot.metadata
+
+    @property
+    def filter_index(self):
+        return self._snapshot.filter_index
+
+    @property
+    def bm25_index(self):
+        return self._snapshot.bm25_index
+
+    def stats(self):
+        stats = {
+            "retrieval_cache": self.retrieval_cache.stats(),
+            "response_cache": self.response_cache.stats(),
+        }
+        if self.micro_batcher is not None:
+            stats["micro_batcher"] = self.micro_batcher.stats()
+        if self.reranker is not None:
+            stats["reranker"] = self.reranker.stats()
+        if self.llm is not None:
+            stats["context"] = self.context_builder.stats()
+            stats["llm_gateway"] = self.llm_gateway.stats()
+        if self.semantic_cache is not None:
+            stats["semantic_cache"] = self.semantic_cache.stats()
+        return stats
+
+    def close(self):
+        """
+        Writes state worth keeping across restarts (the semantic cache, buffered embedding
+        cache recency) to disk.
+        """
+        if self.semantic_cache is not None:
+            self.semantic_cache.save()
+        if hasattr(self.embeddings, "flush"):
+            self.embeddings.flush()
+
+    def _metadata_from_docstore(self, vector_store):
+        """
+        Builds the metadata store for indexes written before ingestion produced metadata.json,
+        parsing the first chunk seen of each product.
+        """
+        product_metadata, doc_products = {}, {}
+        for doc_id in vector_store.index_to_docstore_id.values():
+            doc = vector_store.docstore.search(doc_id)
+            product = doc.metadata.get('url_slug') or doc.metadata.get('filename', '')
+            if product not in product_metadata:
+                product_metadata[product] = extract_assessment_metadata(
+                    doc.page_content, doc.metadata.get('url_slug', ''), doc.metadata.get('title', '')
+                )
+            doc_products[doc_id] = product
+        return MetadataStore.build(product_metadata, doc_products)
+
+    def _exact_search(self, vector_store, vectors, allowed_rows, k):
+        """
+        Scans the stored vectors of allowed_rows exactly. Approximate indexes can miss most
+        matches of a selective filter (e.g. IVF lists that are never probed), so small
+        filtered subsets bypass them.
+        """
+        candidates = np.ascontiguousarray(vector_store.vectors[allowed_rows], dtype=np.float32)
+        _, positions = faiss.knn(vectors, candidates, min(k, len(allowed_rows)))
+        return np.where(positions >= 0, allowed_rows[positions], -1)
+
+    def _search_ids_batch(self, snapshot, queries, k, timer, filter_key=None):
+        if self.search_client is not None:
+            with timer.stage("search_service"):
+                return self.search_client.search_batch(queries, k, filter_key)
+
+        allowed_rows = snapshot.filter_index.select_rows(filter_key)
+        if allowed_rows is not None and len(allowed_rows) == 0:
+            return [() for _ in queries]
+
+        with timer.stage("embed"):
+            vectors = np.asarray(embed_queries(self.embeddings, list(queries)), dtype=np.float32)
+            if snapshot.vector_store._normalize_L2:
+                faiss.normalize_L2(vectors)
+        if self.semantic_cache is not None:
+            for query, vector in zip(queries, vectors):
+                self.query_vectors.put(normalize_query(query), vector.copy())
+        hybrid = self.hybrid_search and snapshot.bm25_index is not None
+        fetch_k = max(k, self.hybrid_candidates) if hybrid else k
+
+        if self.product_aggregation is None:
+            ranked = self._rank_rows(snapshot, queries, vectors, fetch_k, allowed_rows, hybrid, timer)
+            rows = [ranked_rows[:k] for ranked_rows, _ in ranked]
+        else:
+            rows = self._search_products(snapshot, queries, vectors, k, fetch_k, allowed_rows, hybrid, timer)
+        index_to_id = snapshot.vector_store.index_to_docstore_id
+        return [tuple(index_to_id[row] for row in query_rows if row != -1) for query_rows in rows]
+
+    def _rank_rows(self, snapshot, queries, vectors, fetch_k, allowed_rows, hybrid, timer):
+        """
+        Returns (rows, scores) per query, best first: the top fetch_k dense rows, fused
+        with the BM25 candidates by reciprocal rank when hybrid search is on.
+        """
+        vector_store = snapshot.vector_store
+        with timer.stage("faiss"):
+            if allowed_rows is None:
+                rows = search_index(vector_store, vectors, fetch_k)
+            elif (
+                getattr(vector_store, "index_type", "flat") != "flat"
+                and len(allowed_rows) <= self.exact_filter_max_rows
+            ):
+                rows = self._exact_search(vector_store, vectors, allowed_rows, fetch_k)
+            else:
+                params = search_parameters(vector_store, snapshot.filter_index.selector(allowed_rows))
+                rows = search_index(vector_store, vectors, fetch_k, params=params)
+
+        if not hybrid:
+            return [fused_scores([dense]) for dense in rows]
+        with timer.stage("bm25"):
+            sparse = [snapshot.bm25_index.search(query, fetch_k, allowed_rows) for query in queries]
+        with timer.stage("fusion"):
+            return [fused_scores([dense, lexical]) for dense, lexical in zip(rows, sparse)]
+
+    def _search_products(self, snapshot, queries, vectors, k, fetch_k, allowed_rows, hybrid, timer):
+        """
+        Returns the best chunk row of each of the top-k products per query, widening the
+        search for the queries whose candidates cover fewer than k products.
+        """
+        limit = len(allowed_rows) if allowed_rows is not None else snapshot.vector_store.index.ntotal
+        fetch_k = min(max(fetch_k, k * self.product_overfetch), limit)
+        results = [None] * len(queries)
+        pending = list(range(len(queries)))
+        while pending:
+            ranked = self._rank_rows(
+                snapshot, [queries[i] for i in pending], vectors[pending], fetch_k, allowed_rows, hybrid, timer
+            )
+            widen = []
+            with timer.stage("aggregate"):
+                for i, (rows, scores) in zip(pending, ranked):
+                    results[i], products = aggregate_by_product(
+                        rows, scores, snapshot.filter_index.product_rows, k, self.product_aggregation
+                    )
+                    if products < k and fetch_k < limit:
+                        widen.append(i)
+            pending = widen
+            fetch_k = min(fetch_k * 2, limit)
+        return results
+
+    def _retrieve_ids_batch(self, queries, k, timer=None, filters=None):
+        timer = timer or StageTimer()
+        filter_key = normalize_filters(filters)
+        keys = [(normalize_query(query), k, filter_key) for query in queries]
+        results = [self.retrieval_cache.get(key) for key in keys]
+
+        misses = {}
+        for key, query, doc_ids in zip(keys, queries, results):
+            if doc_ids is None and key not in misses:
+                misses[key] = query
+        if misses:
+            snapshot = self._snapshot
+            found = self._search_ids_batch(snapshot, list(misses.values()), k, timer, filter_key)
+            # Results from a snapshot replaced mid-search must not refill the cleared cache.
+            current = self._snapshot is snapshot
+            for key, doc_ids in zip(misses.keys(), found):
+                if current:
+                    self.retrieval_cache.put(key, doc_ids)
+                misses[key] = doc_ids
+            results = [doc_ids if doc_ids is not None else misses[key] for key, doc_ids in zip(keys, results)]
+        return results
+
+    def _retrieve_ids(self, query, k, filters=None):
+        if self.micro_batcher is None:
+            return self._retrieve_ids_batch([query], k, filters=filters)[0]
+        filter_key = normalize_filters(filters)
+        # Cache hits are answered directly instead of waiting for a batch to close.
+        cached = self.retrieval_cache.get((normalize_query(query), k, filter_key))
+        if cached is not None:
+            return cached
+        return self.micro_batcher((k, filter_key), query)
+
+    def _run_micro_batch(self, key, queries):
+        k, filter_key = key
+        return self._retrieve_ids_batch(queries, k, filters=dict(filter_key) if filter_key else None)
+
+    def _candidates_k(self, k):
+        return max(k, self.rerank_candidates) if self.reranker is not None else k
+
+    def get_documents(self, doc_ids):
+        docs = [self.docstore.search(doc_id) for doc_id in doc_ids]
+        # The search service may briefly run on a newer index than this process has loaded.
+        return [doc for doc in docs if isinstance(doc, Document)]
+
+    def get_metadata(self, doc):
+        """
+        Structured card fields for a retrieved chunk. Indexes built before the metadata
+        store existed fall back to parsing the chunk text.
+        """
+        metadata = self.metadata.get(doc.id)
+        if metadata is None:
+            metadata = extract_assessment_metadata(
+                doc.page_content, doc.metadata.get('url_slug', ''), doc.metadata.get('title', '')
+            )
+        return metadata
+
+    def search(self, query, k=3, filters=None):
+        """
+        filters may set max_duration (minutes), test_types (codes such as "K", "P"; any
+        matches), remote and adaptive (booleans). Filtering happens inside the FAISS search.
+        """
+        self.reload_index_if_changed()
+        docs = self.get_documents(self._retrieve_ids(query, self._candidates_k(k), filters))
+        if self.reranker is not None:
+            with span("rerank"):
+                docs = self.reranker.rerank(query, docs, k)
         return docs
 
-    def recommend(self, query):
-        retrieved_docs = self.search(query, k=4)
-        
+    def search_batch(self, queries, k=3, timer=None, filters=None):
+        """
+        Retrieves the top-k documents for every query using one embedding call and one
+        matrix FAISS search for all cache misses. Stage timings are added to timer.
+        """
+        timer = timer or StageTimer()
+        self.reload_index_if_changed()
+        doc_id_lists = self._retrieve_ids_batch(queries, self._candidates_k(k), timer, filters)
+        with timer.stage("docstore"):
+            doc_lists = [self.get_documents(doc_ids) for doc_ids in doc_id_lists]
+        if self.reranker is not None:
+            with timer.stage("rerank"):
+                doc_lists = self.reranker.rerank_batch(queries, doc_lists, k)
+        return doc_lists
+
+    def _retrieve_for_answer(self, query, filters=None):
+        """
+        Returns (doc IDs, docs, query embedding for the semantic cache or None).
+        """
+        self.reload_index_if_changed()
+        with span("retrieve"):
+            doc_ids = self._retrieve_ids(query, self._candidates_k(self.answer_docs), filters)
+        return self._answer_docs(query, doc_ids)
+
+    async def _aretrieve_for_answer(self, query, filters=None):
+        """
+        Async _retrieve_for_answer. The micro-batcher is awaited from the event loop: a
+        request blocking a search_executor thread on it would cap every batch at
+        SEARCH_WORKERS queries, however many requests are waiting. The pool only runs
+        the reload, docstore, rerank and embedding work around the search.
+        """
+        loop = asyncio.get_running_loop()
+        if self.micro_batcher is None:
+            return await loop.run_in_executor(self.search_executor, self._retrieve_for_answer, query, filters)
+        if self._index_changed():
+            await loop.run_in_executor(self.search_executor, self.reload_index_if_changed)
+        k = self._candidates_k(self.answer_docs)
+        filter_key = normalize_filters(filters)
+        with span("retrieve"):
+            doc_ids = self.retrieval_cache.get((normalize_query(query), k, filter_key))
+            if doc_ids is None:
+                doc_ids = await asyncio.wrap_future(self.micro_batcher.submit((k, filter_key), query))
+        return await loop.run_in_executor(self.search_executor, self._answer_docs, query, doc_ids)
+
+    def _answer_docs(self, query, doc_ids):
+        with span("docstore"):
+            docs = self.get_documents(doc_ids)
+        query_vector = self._query_vector(query) if self.semantic_cache is not None else None
+        if self.reranker is None:
+            return doc_ids, docs, query_vector
+        with span("rerank"):
+            docs = self.reranker.rerank(query, docs, self.answer_docs)
+        return tuple(doc.id for doc in docs), docs, query_vector
+
+    def _query_vector(self, query):
+        # Normally left behind by the search; only embedded again after a retrieval-cache hit
+        # whose vector has since been evicted.
+        vector = self.query_vectors.get(normalize_query(query))
+        if vector is None:
+            vector = np.asarray(embed_queries(self.embeddings, [query])[0], dtype=np.float32)
+        return vector
+
+    def _build_chain(self):
+        prompt = PromptTemplate(
+            template=PROMPT_TEMPLATE,
+            input_variables=["context", "query"]
+        )
+        return prompt | self.llm | StrOutputParser()
+
+    def _get_chain(self):
+        # Built once per engine; rebuilt only if self.llm is replaced (e.g. by a stub).
+        if self._chain is None or self._chain[0] is not self.llm:
+            self._chain = (self.llm, self._build_chain())
+        return self._chain[1]
+
+    def build_context(self, retrieved_docs):
+        context, _ = self.context_builder.build(
+            retrieved_docs, [self.get_metadata(doc) for doc in retrieved_docs]
+        )
+        return context
+
+    def _semantic_scope(self, response_key):
+        _, doc_ids, prompt_version = response_key
+        return f"{prompt_version}|" + "|".join(sorted(doc_ids))
+
+    def _semantic_lookup(self, query, response_key, query_vector):
+        if self.semantic_cache is None:
+            return None
+        if query_vector is None:
+            query_vector = self._query_vector(query)
+        with span("semantic_cache"):
+            cached, _ = self.semantic_cache.get(query_vector, self._semantic_scope(response_key))
+        if cached is not None:
+            self.response_cache.put(response_key, cached)
+        return cached
+
+    def _semantic_store(self, query, response_key, query_vector, response):
+        if self.semantic_cache is None:
+            return
+        if query_vector is None:
+            query_vector = self._query_vector(query)
+        self.semantic_cache.put(query_vector, query, self._semantic_scope(response_key), response)
+        self.semantic_cache.save_if_due()
+
+    def _cached_response(self, query, response_key, query_vector):
+        """
+        The exact response cache is tried first, then the semantic cache.
+        """
+        cached = self.response_cache.get(response_key)
+        if cached is not None:
+            return cached
+        return self._semantic_lookup(query, response_key, query_vector)
+
+    async def _acached_response(self, query, response_key, query_vector):
+        # The semantic lookup may embed the query, so it runs off the event loop.
+        cached = self.response_cache.get(response_key)
+        if cached is not None or self.semantic_cache is None:
+            return cached
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.search_executor, self._semantic_lookup, query, response_key, query_vector
+        )
+
+    def _store_response(self, query, response_key, query_vector, response):
+        self.response_cache.put(response_key, response)
+        self._semantic_store(query, response_key, query_vector, response)
+
+    async def _astore_response(self, query, response_key, query_vector, response):
+        # Off the event loop: storing can evict from the FAISS index and save the cache to disk.
+        self.response_cache.put(response_key, response)
+        if self.semantic_cache is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(
+                self.search_executor, self._semantic_store, query, response_key, query_vector, response
+            )
+
+    def _generation_failed(self, error, retrieved_docs):
+        """
+        Records why generation failed and returns the raw-results answer to send instead.
+        """
+        if isinstance(error, CircuitOpenError):
+            reason = "circuit_open"
+        elif isinstance(error, (TimeoutError, asyncio.TimeoutError)):
+            reason = "timeout"
+            print(f"LLM generation timed out after {self.llm_timeout}s.")
+        else:
+            reason = "rate_limit" if is_rate_limit_error(error) else "error"
+            print(f"LLM generation failed ({reason}): {error}")
+        if reason == "rate_limit":
+            RATE_LIMIT_ERRORS.labels("llm").inc()
+        LLM_CALLS.labels(reason).inc()
+        LLM_FALLBACKS.labels(reason).inc()
+        return self._fallback_response(retrieved_docs)
+
+    def _fallback_response(self, retrieved_docs):
+        print("Falling back to raw search results.")
+        results = "I couldn't generate a summarized recommendation due to high server load, but here are the most relevant assessments I found:\n\n"
+        for i, doc in enumerate(retrieved_docs, 1):
+            results += f"**{i}. {doc.metadata.get('title', 'Unknown Title')}**\n"
+            results += f"{doc.page_content[:300]}...\n\n"
+        return results
+
+    def _search_only_response(self, retrieved_docs):
+        results = "Based on your query, here are some relevant assessments:\n"
+        for i, doc in enumerate(retrieved_docs, 1):
+            results += f"{i}. {doc.metadata.get('title', 'Unknown Title')}\n"
+            results += f"   {doc.page_content[:200]}...\n\n"
+        return results
+
+    def recommend(self, query, filters=None):
+        doc_ids, retrieved_docs, query_vector = self._retrieve_for_answer(query, filters)
+
         if not retrieved_docs:
             return "I couldn't find any relevant assessments for your request."
 
-        context_text = "\n\n".join([doc.page_content for doc in retrieved_docs])
-
-        if self.llm:
-            prompt_template = """
-            You are an expert consultant for SHL, a global leader in talent acquisition and management.
-            Your goal is to recommend the best assessments based on the user's needs.
-            
-            Use the following context (details about SHL assessments) to answer the user's request.
-            If the answer is not in the context, say you don't have enough information.
-            
-            Context:
-            {context}
-            
-            User Request: {query}
-            
-            Recommendation:
-            """
-            
-            prompt = PromptTemplate(
-                template=prompt_template,
-                input_variables=["context", "query"]
+        if not self.llm:
+            return self._search_only_response(retrieved_docs)
+
+        response_key = (normalize_query(query), doc_ids, PROMPT_VERSION)
+        cached = self._cached_response(query, response_key, query_vector)
+        if cached is not None:
+            return cached
+
+        with span("prompt"):
+            context_text = self.build_context(retrieved_docs)
+            chain = self._get_chain()
+        try:
+            with span("llm"):
+                response = self.llm_gateway.invoke(chain, {"context": context_text, "query": query})
+            LLM_CALLS.labels("success").inc()
+            self._store_response(query, response_key, query_vector, response)
+            return response
+        except Exception as e:
+            return self._generation_failed(e, retrieved_docs)
+
+    async def _acquire_llm_slot(self):
+        if self._llm_slots is None:
+            self._llm_slots = asyncio.Semaphore(self.max_concurrent_llm_calls)
+        try:
+            await asyncio.wait_for(self._llm_slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            OVERLOAD_REJECTIONS.inc()
+            raise EngineOverloadedError(
+                f"No LLM slot became free within {self.queue_timeout}s; too many requests in flight."
             )
-            
-            try:
-                chain = prompt | self.llm | StrOutputParser()
-                response = chain.invoke({"context": context_text, "query": query})
-                return response
-            except Exception as e:
-                print(f"LLM generation failed (likely rate limit): {e}")
-                print("Falling back to raw search results.")
-                results = "I couldn't generate a summarized recommendation due to high server load, but here are the most relevant assessments I found:\n\n"
-                for i, doc in enumerate(retrieved_docs, 1):
-                    results += f"**{i}. {doc.metadata.get('title', 'Unknown Title')}**\n"
-                    results += f"{doc.page_content[:300]}...\n\n"
-                return results
-        
-        else:
-            results = "Based on your query, here are some relevant assessments:\n"
-            for i, doc in enumerate(retrieved_docs, 1):
-                results += f"{i}. {doc.metadata.get('title', 'Unknown Title')}\n"
-                results += f"   {doc.page_content[:200]}...\n\n"
-            return results
+
+    async def arecommend(self, query, filters=None):
+        """
+        Non-blocking variant of recommend() for use from an event loop.
+        """
+        doc_ids, retrieved_docs, query_vector = await self._aretrieve_for_answer(query, filters)
+        return await self.agenerate(query, doc_ids, retrieved_docs, query_vector)
+
+    async def agenerate(self, query, doc_ids, retrieved_docs, query_vector=None):
+        """
+        Produces the recommendation text for documents that were already retrieved.
+        query_vector is the query's embedding if the caller has it (for the semantic cache).
+        """
+        if not retrieved_docs:
+            return "I couldn't find any relevant assessments for your request."
+
+        if not self.llm:
+            return self._search_only_response(retrieved_docs)
+
+        response_key = (normalize_query(query), tuple(doc_ids), PROMPT_VERSION)
+        cached = await self._acached_response(query, response_key, query_vector)
+        if cached is not None:
+            return cached
+
+        with span("prompt"):
+            context_text = self.build_context(retrieved_docs)
+            chain = self._get_chain()
+        if self.llm_gateway.breaker.is_open():
+            # Fail fast instead of queueing for a slot the call would not use.
+            return self._generation_failed(CircuitOpenError("LLM circuit breaker is open."), retrieved_docs)
+        with span("llm_queue"):
+            await self._acquire_llm_slot()
+        try:
+            with span("llm"):
+                response = await self.llm_gateway.ainvoke(chain, {"context": context_text, "query": query})
+            LLM_CALLS.labels("success").inc()
+            await self._astore_response(query, response_key, query_vector, response)
+            return response
+        except Exception as e:
+            return self._generation_failed(e, retrieved_docs)
+        finally:
+            self._llm_slots.release()
+
+    def summarize_documents(self, docs):
+        return [
+            {
+                "id": doc.id,
+                "url_slug": doc.metadata.get('url_slug', ''),
+                **self.get_metadata(doc)
+            }
+            for doc in docs
+        ]
+
+    def stream_recommend(self, query, filters=None):
+        """
+        Synchronous generator yielding the recommendation text piece by piece as the LLM produces it.
+        """
+        doc_ids, retrieved_docs, query_vector = self._retrieve_for_answer(query, filters)
+
+        if not retrieved_docs:
+            yield "I couldn't find any relevant assessments for your request."
+            return
+
+        if not self.llm:
+            yield self._search_only_response(retrieved_docs)
+            return
+
+        response_key = (normalize_query(query), doc_ids, PROMPT_VERSION)
+        cached = self._cached_response(query, response_key, query_vector)
+        if cached is not None:
+            yield cached
+            return
+
+        with span("prompt"):
+            context_text = self.build_context(retrieved_docs)
+            chain = self._get_chain()
+        parts = []
+        try:
+            with span("llm_stream"):
+                for token in self.llm_gateway.stream(chain, {"context": context_text, "query": query}):
+                    parts.append(token)
+                    yield token
+            LLM_CALLS.labels("success").inc()
+            self._store_response(query, response_key, query_vector, "".join(parts))
+        except Exception as e:
+            yield ("\n\n" if parts else "") + self._generation_failed(e, retrieved_docs)
+
+    async def astream_recommend(self, query, filters=None):
+        """
+        Async generator of (event, data) pairs: a "results" event with the retrieved assessments
+        as soon as retrieval finishes, then "token" events as the LLM streams its answer, and a
+        final "done". A "fallback" event replaces the answer when generation fails or times out.
+        """
+        doc_ids, retrieved_docs, query_vector = await self._aretrieve_for_answer(query, filters)
+        yield "results", {"assessments": self.summarize_documents(retrieved_docs)}
+
+        if not retrieved_docs:
+            yield "token", "I couldn't find any relevant assessments for your request."
+            yield "done", {}
+            return
+
+        if not self.llm:
+            yield "token", self._search_only_response(retrieved_docs)
+            yield "done", {}
+            return
+
+        response_key = (normalize_query(query), doc_ids, PROMPT_VERSION)
+        cached = await self._acached_response(query, response_key, query_vector)
+        if cached is not None:
+            yield "token", cached
+            yield "done", {}
+            return
+
+        with span("prompt"):
+            context_text = self.build_context(retrieved_docs)
+            chain = self._get_chain()
+        if self.llm_gateway.breaker.is_open():
+            yield "fallback", self._generation_failed(CircuitOpenError("LLM circuit breaker is open."), retrieved_docs)
+            yield "done", {}
+            return
+        with span("llm_queue"):
+            await self._acquire_llm_slot()
+        parts = []
+        try:
+            with span("llm_stream"):
+                async for token in self.llm_gateway.astream(chain, {"context": context_text, "query": query}):
+                    parts.append(token)
+                    yield "token", token
+            LLM_CALLS.labels("success").inc()
+            await self._astore_response(query, response_key, query_vector, "".join(parts))
+        except Exception as e:
+            yield "fallback", self._generation_failed(e, retrieved_docs)
+        finally:
+            self._llm_slots.release()
+        yield "done", {}
 
 if __name__ == "__main__":
     # Test the engine
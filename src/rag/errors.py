@@ -0,0 +1,8 @@
+def is_rate_limit_error(error):
+    return "429" in str(error) or "RESOURCE_EXHAUSTED" in str(error)
+
+class EngineOverloadedError(Exception):
+    """Raised when a request waited longer than the queue timeout for an LLM slot."""
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the LLM while its circuit breaker is open."""
@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from src.rag.errors import CircuitOpenError
+from src.utils.metrics import LLM_CIRCUIT_OPEN, LLM_HEDGES
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failed LLM calls. While open, calls are
+    refused immediately so requests fall back at once instead of waiting for the provider
+    to time out. After reset_seconds one trial call is let through (half-open): success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """
+        True while calls would be refused; unlike allow(), does not claim the half-open trial.
+        """
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self.opened_at < self.reset_seconds
+            return self.state == "half_open" and self._trial_in_flight
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    return False
+                self.state = "half_open"
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self.state != "closed":
+                print("LLM circuit closed.")
+                self.state = "closed"
+                LLM_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                print(f"LLM circuit opened after {self.failures} consecutive failures; "
+                      f"retrying in {self.reset_seconds}s.")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                LLM_CIRCUIT_OPEN.set(1)
+
+    def release_trial(self):
+        """
+        Frees the half-open trial slot without judging the provider, for calls the caller
+        abandoned (a cancelled task, a closed stream).
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures, "times_opened": self.times_opened}
+
+class LLMGateway:
+    """
+    Runs LangChain runnables against the LLM with a circuit breaker, a per-request
+    deadline and optional hedging: if no answer arrived after hedge_after_ms, a second
+    identical request is sent and whichever finishes first wins. Streams are not hedged,
+    and a synchronous stream can only check its deadline between tokens (the HTTP client
+    timeout bounds a stalled read).
+
+    Every call raises CircuitOpenError, TimeoutError or the provider's error on failure,
+    so callers keep a single fallback path.
+    """
+
+    def __init__(self, timeout=30.0, hedge_after_ms=0.0, breaker=None, max_workers=32):
+        self.timeout = timeout
+        self.hedge_after_ms = hedge_after_ms
+        self.breaker = breaker or CircuitBreaker()
+        self.hedges = {"primary": 0, "hedge": 0}
+        self._lock = threading.Lock()
+        # Sync calls run here so the deadline can be enforced without blocking on the socket.
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def _admit(self):
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM circuit breaker is open; skipping the call.")
+
+    def _record_hedge(self, winner):
+        with self._lock:
+            self.hedges[winner] += 1
+        LLM_HEDGES.labels(winner).inc()
+
+    def _finish(self, error=None):
+        if error is None:
+            self.breaker.record_success()
+        elif isinstance(error, Exception):
+            self.breaker.record_failure()
+        else:
+            # CancelledError, GeneratorExit, KeyboardInterrupt, SystemExit: the caller gave
+            # up on the call, which says nothing about the provider's health.
+            self.breaker.release_trial()
+
+    def invoke(self, runnable, inputs):
+        self._admit()
+        deadline = time.monotonic() + self.timeout
+        attempts = [self._executor.submit(runnable.invoke, inputs)]
+        try:
+            result = self._first_result(runnable, inputs, attempts, deadline)
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish()
+        return result
+
+    def _first_result(self, runnable, inputs, attempts, deadline):
+        hedge_at = time.monotonic() + self.hedge_after_ms / 1000 if self.hedge_after_ms else None
+        pending, error = set(attempts), None
+        while pending:
+            wake_at = min(deadline, hedge_at) if hedge_at else deadline
+            done, pending = wait(pending, timeout=max(0.0, wake_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if len(attempts) > 1:
+                        self._record_hedge("primary" if future is attempts[0] else "hedge")
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+            if hedge_at and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if pending and time.monotonic() < deadline:
+                    hedge = self._executor.submit(runnable.invoke, inputs)
+                    attempts.append(hedge)
+                    pending.add(hedge)
+            elif time.monotonic() >= deadline and pending:
+                for other in pending:
+                    other.cancel()
+                raise TimeoutError(f"LLM call exceeded its {self.timeout}s deadline.")
+        raise error
+
+    async def ainvoke(self, runnable, inputs):
+        self._admit()
+        try:
+            result = await asyncio.wait_for(self._ahedged(runnable, inputs), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._finish(TimeoutError())
+            raise TimeoutError(f"LLM call exceeded its {self.timeout}s deadline.")
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish()
+        return result
+
+    async def _ahedged(self, runnable, inputs):
+        primary = asyncio.ensure_future(runnable.ainvoke(inputs))
+        if not self.hedge_after_ms:
+            return await primary
+        attempts = [primary]
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=self.hedge_after_ms / 1000)
+            if not done:
+                attempts.append(asyncio.ensure_future(runnable.ainvoke(inputs)))
+            error = None
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(attempts) > 1:
+                            self._record_hedge("primary" if task is primary else "hedge")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    def stream(self, runnable, inputs):
+        self._admit()
+        deadline = time.monotonic() + self.timeout
+        try:
+            for token in runnable.stream(inputs):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"LLM stream exceeded its {self.timeout}s deadline.")
+                yield token
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish()
+
+    async def astream(self, runnable, inputs):
+        self._admit()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        tokens = runnable.astream(inputs).__aiter__()
+        try:
+            while True:
+                try:
+                    token = await asyncio.wait_for(tokens.__anext__(), timeout=max(0.0, deadline - loop.time()))
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"LLM stream exceeded its {self.timeout}s deadline.")
+                yield token
+        except BaseException as e:
+            self._finish(e)
+            raise
+        self._finish()
+
+    def stats(self):
+        with self._lock:
+            hedges = dict(self.hedges)
+        return {
+            "timeout_s": self.timeout,
+            "hedge_after_ms": self.hedge_after_ms,
+            "hedged_requests_won_by": hedges,
+            "circuit": self.breaker.stats(),
+        }
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from src.rag.cache import TTLCache
+from src.utils.metrics import RERANKS
+from src.utils.text import normalize_query
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+class CrossEncoderReranker:
+    """
+    Reorders dense search candidates with a small CPU cross-encoder.
+
+    Scores are cached per (normalized query, chunk ID) pair, and all uncached pairs of a
+    call are scored in one batched predict. If scoring does not finish within the latency
+    budget the dense order is returned instead; the scores still land in the cache once
+    the predict completes, so a repeated query is reranked next time.
+    """
+
+    def __init__(self, model_name=DEFAULT_RERANK_MODEL, budget_ms=150.0, max_length=256, batch_size=64,
+                 cache_entries=50000, cache_ttl=3600, model=None):
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        self.model = model
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.batch_size = batch_size
+        self.score_cache = TTLCache(max_entries=cache_entries, ttl=cache_ttl, name="rerank")
+        # A single scoring thread: concurrent requests queue behind each other instead of
+        # oversubscribing the CPU, and time spent queued counts against their budget.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rerank")
+        self._lock = threading.Lock()
+        self._outcomes = {}
+
+    def _record(self, outcome):
+        with self._lock:
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+        RERANKS.labels(outcome).inc()
+
+    def _score(self, pairs, keys):
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        for key, score in zip(keys, scores):
+            self.score_cache.put(key, float(score))
+        return scores
+
+    def rerank_batch(self, queries, doc_lists, k, budget_ms=None):
+        """
+        Returns every candidate list sorted by cross-encoder score and cut to k. When scoring
+        fails or exceeds budget_ms (0 means no limit), all lists keep their dense order.
+        """
+        started = time.perf_counter()
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        scores, pairs, keys = {}, [], []
+        for query, docs in zip(queries, doc_lists):
+            normalized = normalize_query(query)
+            for doc in docs:
+                key = (normalized, doc.id or doc.page_content)
+                if key in scores:
+                    continue
+                scores[key] = self.score_cache.get(key)
+                if scores[key] is None:
+                    pairs.append((query, doc.page_content))
+                    keys.append(key)
+
+        if pairs:
+            future = self._executor.submit(self._score, pairs, keys)
+            timeout = max(0.0, budget_ms / 1000 - (time.perf_counter() - started)) if budget_ms else None
+            try:
+                scores.update(zip(keys, map(float, future.result(timeout=timeout))))
+            except FutureTimeoutError:
+                future.cancel()  # drop it if still queued; a running predict finishes into the cache
+                self._record("budget_exceeded")
+                return [docs[:k] for docs in doc_lists]
+            except Exception as e:
+                print(f"Reranking failed, keeping dense order: {e}")
+                self._record("error")
+                return [docs[:k] for docs in doc_lists]
+        self._record("reranked" if pairs else "cached")
+
+        reranked = []
+        for query, docs in zip(queries, doc_lists):
+            normalized = normalize_query(query)
+            # sorted() is stable, so ties keep their dense order.
+            reranked.append(sorted(
+                docs, key=lambda doc: scores[(normalized, doc.id or doc.page_content)], reverse=True
+            )[:k])
+        return reranked
+
+    def rerank(self, query, docs, k, budget_ms=None):
+        return self.rerank_batch([query], [docs], k, budget_ms)[0]
+
+    def stats(self):
+        with self._lock:
+            outcomes = dict(self._outcomes)
+        return {"model": self.model_name, "budget_ms": self.budget_ms, "outcomes": outcomes,
+                "score_cache": self.score_cache.stats()}
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+from src.utils.metrics import CACHE_LOOKUPS
+
+class SemanticCache:
+    """
+    Caches generated answers by query meaning rather than query text. Query embeddings are
+    kept in a small inner-product FAISS index (vectors are L2-normalized, so scores are
+    cosine similarities); a lookup returns the answer of the most similar stored query whose
+    cosine is at least threshold and whose scope string (the caller encodes the prompt
+    version and retrieved doc set in it) equals the new request's, so an answer is only
+    reused for the same context.
+
+    Entries are evicted least recently used first beyond max_entries and expire ttl seconds
+    after they were stored. The cache is written to path (one .npz file, replaced
+    atomically) by save(), or by save_if_due() at most every save_interval seconds.
+    """
+
+    def __init__(self, path=None, model_name="", threshold=0.9, max_entries=5000, ttl=86400,
+                 neighbours=4, save_interval=60):
+        self.path = path
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.neighbours = neighbours
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self.scope_mismatches = 0
+        # id -> (vector, query, scope, response, expires_at); wall-clock expiry so it survives restarts.
+        self._entries = OrderedDict()
+        self._index = None
+        self._next_id = 0
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        self._hit_counter = CACHE_LOOKUPS.labels("semantic", "hit")
+        self._miss_counter = CACHE_LOOKUPS.labels("semantic", "miss")
+        if path:
+            self._load()
+
+    def _normalize(self, vector):
+        vector = np.array(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _add(self, entry_id, vector, entry):
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+        self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+        self._entries[entry_id] = (vector[0],) + entry
+
+    def _remove(self, entry_ids):
+        for entry_id in entry_ids:
+            del self._entries[entry_id]
+        self._index.remove_ids(np.array(entry_ids, dtype=np.int64))
+        self._dirty = True
+
+    def get(self, vector, scope):
+        """
+        Returns (response, cosine similarity) of the closest matching entry, or (None, None).
+        """
+        vector = self._normalize(vector)
+        with self._lock:
+            if self._index is None or not self._entries or vector.shape[1] != self._index.d:
+                return self._miss()
+            scores, ids = self._index.search(vector, min(self.neighbours, len(self._entries)))
+            now, expired = time.time(), []
+            found = None
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                _, _, entry_scope, response, expires_at = self._entries[entry_id]
+                if expires_at < now:
+                    expired.append(int(entry_id))
+                elif entry_scope == scope:
+                    found = (int(entry_id), response, float(score))
+                    break
+                else:
+                    self.scope_mismatches += 1
+            if expired:
+                self._remove(expired)
+            if found is None:
+                return self._miss()
+            entry_id, response, score = found
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            self._hit_counter.inc()
+            return response, score
+
+    def _miss(self):
+        self.misses += 1
+        self._miss_counter.inc()
+        return None, None
+
+    def put(self, vector, query, scope, response):
+        vector = self._normalize(vector)
+        with self._lock:
+            if self._index is not None and vector.shape[1] != self._index.d:
+                return
+            self._add(self._next_id, vector, (query, scope, response, time.time() + self.ttl))
+            self._next_id += 1
+            if len(self._entries) > self.max_entries:
+                self._remove(list(self._entries)[:len(self._entries) - self.max_entries])
+            self._dirty = True
+
+    def save_if_due(self):
+        """
+        Saves if the cache changed and save_interval has passed since the last save.
+        """
+        with self._lock:
+            due = self._dirty and time.monotonic() - self._last_save >= self.save_interval
+        if due:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index = None
+            self._dirty = True
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            self._last_save = time.monotonic()
+            self._dirty = False
+            entries = list(self._entries.values())
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            meta = {
+                "model_name": self.model_name,
+                "entries": [
+                    {"query": query, "scope": scope, "response": response, "expires_at": expires_at}
+                    for _, query, scope, response, expires_at in entries
+                ],
+            }
+            vectors = np.stack([entry[0] for entry in entries]) if entries else np.zeros((0, 0), dtype=np.float32)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, vectors=vectors, meta=np.array(json.dumps(meta)))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save semantic cache to {self.path}: {e}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                vectors = data["vectors"].astype(np.float32)
+                meta = json.loads(str(data["meta"]))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable semantic cache at {self.path}: {e}")
+            return
+        if meta.get("model_name") != self.model_name:
+            print(f"Semantic cache at {self.path} was built with another embedding model; starting empty.")
+            return
+        now = time.time()
+        # Saved least recently used first, so re-adding in order restores the LRU order.
+        for vector, entry in list(zip(vectors, meta["entries"]))[-self.max_entries:]:
+            if entry["expires_at"] >= now:
+                self._add(self._next_id, vector.reshape(1, -1),
+                          (entry["query"], entry["scope"], entry["response"], entry["expires_at"]))
+                self._next_id += 1
+        print(f"Loaded {len(self._entries)} semantic cache entries from {self.path}")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "scope_mismatches": self.scope_mismatches,
+            "entries": len(self._entries),
+            "threshold": self.threshold,
+        }
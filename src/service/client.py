@@ -0,0 +1,69 @@
+import json
+import socket
+import threading
+
+class SearchServiceError(Exception):
+    """Raised when the search service reports an error or cannot be reached."""
+
+class SearchServiceClient:
+    """
+    Blocking client for the search service. Each thread keeps its own Unix socket
+    connection, and a dropped connection is re-established once per request.
+    """
+
+    def __init__(self, socket_path, timeout=10.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            sock, reader = conn
+            reader.close()
+            sock.close()
+            self._local.conn = None
+
+    def _call(self, payload):
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        for attempt in range(2):
+            try:
+                sock, reader = self._connection()
+                sock.sendall(line)
+                response = reader.readline()
+                if not response:
+                    raise ConnectionError("search service closed the connection")
+                break
+            except OSError as e:
+                self._close()
+                if attempt == 1:
+                    raise SearchServiceError(f"Search service at {self.socket_path} unavailable: {e}")
+        response = json.loads(response)
+        if "error" in response:
+            raise SearchServiceError(response["error"])
+        return response
+
+    def search_batch(self, queries, k, filter_key=None):
+        """
+        Returns one tuple of doc IDs per query, as AssessmentRecommendationEngine would.
+        """
+        response = self._call({
+            "op": "search",
+            "queries": list(queries),
+            "k": k,
+            "filters": dict(filter_key) if filter_key else None
+        })
+        return [tuple(doc_ids) for doc_ids in response["doc_ids"]]
+
+    def stats(self):
+        return self._call({"op": "stats"})
@@ -0,0 +1,100 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.rag.batcher import MicroBatcher
+from src.vector_store.filters import normalize_filters
+
+DEFAULT_SOCKET = "/tmp/shl-search.sock"
+
+class SearchService:
+    """
+    Owns the one embedding model and FAISS index on a node and answers search requests
+    from API workers over a Unix domain socket. Queries that arrive within max_wait_ms of
+    each other are embedded and searched together, up to max_batch_size at a time.
+
+    Protocol: one JSON object per line in each direction. Requests look like
+    {"op": "search", "queries": [...], "k": 4, "filters": {...}} and are answered with
+    {"doc_ids": [[...], ...]} or {"error": "..."}.
+    """
+
+    def __init__(self, engine, max_batch_size=64, max_wait_ms=2.0):
+        self.engine = engine
+        self.batcher = MicroBatcher(
+            self._run_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name="search-service-batcher"
+        )
+
+    def _run_batch(self, key, queries):
+        k, filter_key = key
+        self.engine.reload_index_if_changed()
+        return self.engine._retrieve_ids_batch(queries, k, filters=dict(filter_key) if filter_key else None)
+
+    async def submit(self, query, k, filters):
+        doc_ids = await asyncio.wrap_future(self.batcher.submit((k, normalize_filters(filters)), query))
+        return list(doc_ids)
+
+    async def _respond(self, request, writer):
+        try:
+            if request.get("op") == "stats":
+                response = self.batcher.stats()
+            elif request.get("op") == "search":
+                k = int(request.get("k", 4))
+                doc_ids = await asyncio.gather(
+                    *(self.submit(query, k, request.get("filters")) for query in request["queries"])
+                )
+                response = {"doc_ids": doc_ids}
+            else:
+                response = {"error": f"Unknown op: {request.get('op')}"}
+        except Exception as e:
+            response = {"error": str(e)}
+        writer.write((json.dumps(response) + "\n").encode("utf-8"))
+        await writer.drain()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                # Clients wait for each answer before sending the next request on a connection.
+                await self._respond(json.loads(line), writer)
+        except (ConnectionError, ValueError) as e:
+            print(f"Dropping search client connection: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(self._handle_connection, path=socket_path)
+        print(f"Search service listening on {socket_path}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve embedding + FAISS search to API workers over a Unix socket.")
+    parser.add_argument("--socket", default=os.getenv("SEARCH_SERVICE_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--index-path", default="data/faiss_index")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    # The service is the process that owns the model, so it must not delegate to itself.
+    os.environ.pop("SEARCH_SERVICE_SOCKET", None)
+    # Batching happens in the service itself; the engine's own batcher would only add latency.
+    os.environ["MICRO_BATCH"] = "0"
+    # Workers rerank the candidates the service returns, so the service needs no cross-encoder.
+    os.environ["RERANK"] = "0"
+    from src.rag.engine import AssessmentRecommendationEngine
+    engine = AssessmentRecommendationEngine(index_path=args.index_path)
+    engine.warm_up()
+
+    service = SearchService(engine, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    asyncio.run(service.serve(args.socket))
+
+if __name__ == "__main__":
+    main()
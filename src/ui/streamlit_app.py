@@ -1,12 +1,11 @@
 import streamlit as st
 import sys
 import os
-import re
-import json
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from src.rag.engine import AssessmentRecommendationEngine
+from src.utils.metadata import TEST_TYPE_LABELS
 
 st.set_page_config(
     page_title="SHL Assessment Recommender",
@@ -105,72 +104,26 @@ def get_engine():
 
 engine = get_engine()
 
-@st.cache_data
-def load_links_data():
-    links_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'shl_links.json')
-    if os.path.exists(links_path):
-        try:
-            with open(links_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return {item.get('name', '').strip(): item for item in data}
-        except:
-            return {}
-    return {}
-
-links_data = load_links_data()
-
-def parse_assessment_content(content, url_slug, title):
-    duration_match = re.search(r"Approximate Completion Time in minutes = (?:max )?(\d+)", content)
-    duration = f"{duration_match.group(1)} minutes" if duration_match else "N/A"
-    
-    type_match = re.search(r"Test Type: ([\w\s]+?)(?:Remote|Product)", content)
-    test_type = type_match.group(1).strip() if type_match else "N/A"
-    
-    remote_match = re.search(r"Remote Testing: ([\w\s]+)", content)
-    remote = remote_match.group(1).strip() if remote_match else "N/A"
-    
-    desc_start = content.find("Description")
-    desc_end = content.find("Job levels")
-    if desc_start != -1 and desc_end != -1:
-        description = content[desc_start + 11:desc_end].strip()
-    else:
-        description = content[:300] + "..."
-
-    url = f"https://www.shl.com/solutions/products/product-catalog/view/{url_slug}/"
-    
-    clean_title = title.replace(" | SHL", "").strip()
-    link_info = links_data.get(clean_title)
-    
-    adaptive = "No"
-    
-    if link_info:
-        if link_info.get('adaptive_irt'):
-            adaptive = link_info.get('adaptive_irt')
-        
-        if link_info.get('url'):
-            url = link_info.get('url')
-            
-        if link_info.get('test_type') and link_info.get('test_type') != "N/A":
-            test_type = link_info.get('test_type')
-            
-        if link_info.get('remote_testing') and link_info.get('remote_testing') != "N/A":
-            remote = link_info.get('remote_testing')
-            
-        if link_info.get('duration') and link_info.get('duration') != "N/A":
-            duration = link_info.get('duration')
-    
-    return {
-        "duration": duration,
-        "test_type": test_type,
-        "remote": remote,
-        "description": description,
-        "url": url,
-        "adaptive": adaptive
-    }
-
 st.markdown("**Describe your requirements:**")
 query = st.text_area("Describe your requirements:", label_visibility="collapsed", placeholder="Example: I need a python coding test for a senior backend developer with SQL skills...", height=100)
 
+with st.expander("Filters"):
+    max_duration = st.slider("Maximum duration (minutes, 0 = any)", min_value=0, max_value=120, value=0, step=5)
+    test_types = st.multiselect(
+        "Test types",
+        options=list(TEST_TYPE_LABELS),
+        format_func=lambda code: f"{code} - {TEST_TYPE_LABELS[code]}"
+    )
+    remote_only = st.checkbox("Remote testing only")
+    adaptive_only = st.checkbox("Adaptive (IRT) only")
+
+filters = {
+    "max_duration": max_duration or None,
+    "test_types": test_types,
+    "remote": True if remote_only else None,
+    "adaptive": True if adaptive_only else None,
+}
+
 if st.button("Get Recommendations"):
     if not query:
         st.warning("Please enter a job description.")
@@ -180,11 +133,13 @@ if st.button("Get Recommendations"):
         st.markdown("### Recommended Assessments")
         
         with st.spinner("Searching..."):
-            docs = engine.search(query, k=5)
+            docs = engine.search(query, k=5, filters=filters)
+            if not docs:
+                st.info("No assessments match the selected filters.")
             
             for i, doc in enumerate(docs, 1):
                 title = doc.metadata.get('title', 'Unknown Assessment')
-                meta = parse_assessment_content(doc.page_content, doc.metadata.get('url_slug', ''), title)
+                meta = engine.get_metadata(doc)
                 
                 with st.container():
                     st.markdown(f"""
@@ -201,5 +156,9 @@ if st.button("Get Recommendations"):
                     </div>
                     """, unsafe_allow_html=True)
 
+        if engine.llm:
+            st.markdown("### AI Recommendation")
+            st.write_stream(engine.stream_recommend(query, filters=filters))
+
 st.markdown("---")
 st.markdown("Powered by SHL Product Catalog & Google Gemini")
@@ -0,0 +1,113 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+LINKS_DATA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "shl_links.json"
+)
+
+TEST_TYPE_LABELS = {
+    "A": "Ability & Aptitude",
+    "B": "Biodata & Situational Judgement",
+    "C": "Competencies",
+    "D": "Development & 360",
+    "E": "Assessment Exercises",
+    "K": "Knowledge & Skills",
+    "P": "Personality & Behavior",
+    "S": "Simulations",
+}
+
+METADATA_FIELDS = ["title", "url", "duration", "duration_minutes", "test_type", "remote", "adaptive", "description"]
+
+@lru_cache(maxsize=None)
+def load_links_data(links_path=LINKS_DATA_PATH):
+    """
+    Returns the entries of shl_links.json keyed by assessment name.
+    """
+    if not os.path.exists(links_path):
+        return {}
+    try:
+        with open(links_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+            return {item.get('name', '').strip(): item for item in data}
+    except (OSError, ValueError):
+        return {}
+
+def clean_title(title):
+    return title.replace(" | SHL", "").strip()
+
+def test_type_codes(test_type):
+    return set(re.findall(r"(?<![\w/])([A-Z])(?![\w/])", test_type or "")) & set(TEST_TYPE_LABELS)
+
+def yes_no(value):
+    """
+    Maps a Yes/No field to True/False, or None when the value is missing or unparseable.
+    """
+    value = (value or "").strip().lower()
+    if value.startswith("yes"):
+        return True
+    if value.startswith("no") and not value.startswith("not"):
+        return False
+    return None
+
+def _duration_minutes(duration):
+    match = re.search(r"(\d+)", duration or "")
+    return int(match.group(1)) if match else None
+
+def extract_assessment_metadata(content, url_slug, title, links_data=None):
+    """
+    Pulls the structured fields shown on result cards out of a product page's text and
+    merges them with the matching shl_links.json entry, which takes precedence.
+    """
+    if links_data is None:
+        links_data = load_links_data()
+
+    duration_match = re.search(r"Approximate Completion Time in minutes = (?:max )?(\d+)", content)
+    duration = f"{duration_match.group(1)} minutes" if duration_match else "N/A"
+
+    type_match = re.search(r"Test Type: ([\w\s]+?)(?:Remote|Product)", content)
+    test_type = type_match.group(1).strip() if type_match else "N/A"
+
+    remote_match = re.search(r"Remote Testing: ([\w\s]+)", content)
+    remote = remote_match.group(1).strip() if remote_match else "N/A"
+
+    desc_start = content.find("Description")
+    desc_end = content.find("Job levels")
+    if desc_start != -1 and desc_end != -1:
+        description = content[desc_start + 11:desc_end].strip()
+    else:
+        description = content[:300] + "..."
+
+    url = f"https://www.shl.com/solutions/products/product-catalog/view/{url_slug}/"
+
+    link_info = links_data.get(clean_title(title))
+
+    adaptive = "No"
+
+    if link_info:
+        if link_info.get('adaptive_irt'):
+            adaptive = link_info.get('adaptive_irt')
+
+        if link_info.get('url'):
+            url = link_info.get('url')
+
+        if link_info.get('test_type') and link_info.get('test_type') != "N/A":
+            test_type = link_info.get('test_type')
+
+        if link_info.get('remote_testing') and link_info.get('remote_testing') != "N/A":
+            remote = link_info.get('remote_testing')
+
+        if link_info.get('duration') and link_info.get('duration') != "N/A":
+            duration = link_info.get('duration')
+
+    return {
+        "title": clean_title(title),
+        "url": url,
+        "duration": duration,
+        "duration_minutes": _duration_minutes(duration),
+        "test_type": test_type,
+        "remote": remote,
+        "adaptive": adaptive,
+        "description": description
+    }
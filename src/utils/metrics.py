@@ -0,0 +1,114 @@
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+# Metrics are on when prometheus-client is installed, unless METRICS_ENABLED=0. Disabled
+# metrics are shared no-op objects, so instrumented code pays one method call at most.
+ENABLED = prometheus_client is not None and os.getenv("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class _NoOpMetric:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def set(self, value):
+        pass
+
+_NOOP = _NoOpMetric()
+
+def _metric(kind, name, documentation, labelnames=(), **kwargs):
+    if not ENABLED:
+        return _NOOP
+    return getattr(prometheus_client, kind)(name, documentation, labelnames, **kwargs)
+
+STAGE_SECONDS = _metric(
+    "Histogram", "shl_stage_duration_seconds", "Time spent in each RAG pipeline stage.", ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = _metric(
+    "Histogram", "shl_request_duration_seconds", "API request latency until the response starts.", ["endpoint"],
+    buckets=LATENCY_BUCKETS
+)
+CACHE_LOOKUPS = _metric("Counter", "shl_cache_lookups_total", "Cache lookups by cache and result.", ["cache", "result"])
+LLM_CALLS = _metric("Counter", "shl_llm_calls_total", "LLM generations by outcome.", ["outcome"])
+LLM_FALLBACKS = _metric(
+    "Counter", "shl_llm_fallbacks_total", "Answers that fell back to raw search results.", ["reason"]
+)
+RATE_LIMIT_ERRORS = _metric(
+    "Counter", "shl_rate_limit_errors_total", "429 / RESOURCE_EXHAUSTED errors from hosted APIs.", ["source"]
+)
+LLM_CIRCUIT_OPEN = _metric("Gauge", "shl_llm_circuit_open", "1 while the LLM circuit breaker is open.")
+LLM_HEDGES = _metric(
+    "Counter", "shl_llm_hedged_requests_total", "Hedged LLM requests by which attempt answered first.", ["winner"]
+)
+OVERLOAD_REJECTIONS = _metric(
+    "Counter", "shl_overload_rejections_total", "Requests rejected because no LLM slot freed up in time."
+)
+RERANKS = _metric(
+    "Counter", "shl_rerank_total", "Rerank calls by outcome (reranked, cached, budget_exceeded, error).", ["outcome"]
+)
+CONTEXT_TOKENS = _metric(
+    "Histogram", "shl_llm_context_tokens", "Estimated LLM context tokens per request, sent and saved by packing.",
+    ["kind"], buckets=(0, 50, 100, 200, 400, 800, 1600, 3200, 6400)
+)
+MICRO_BATCH_SIZE = _metric(
+    "Histogram", "shl_micro_batch_size", "Queries per micro-batch.", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+MICRO_BATCH_QUEUE_WAIT = _metric(
+    "Histogram", "shl_micro_batch_queue_wait_seconds", "Time queries wait for their micro-batch to start.",
+    buckets=LATENCY_BUCKETS
+)
+
+_stage_histograms = {}
+
+def _stage_histogram(name):
+    # Resolving labels takes a lock and a dict lookup in prometheus-client; cache the child.
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = _stage_histograms.setdefault(name, STAGE_SECONDS.labels(name))
+    return histogram
+
+@contextmanager
+def _timed_span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stage_histogram(name).observe(time.perf_counter() - start)
+
+def span(name):
+    """
+    Records the time spent in the enclosed block under stage=name.
+    """
+    return _timed_span(name) if ENABLED else nullcontext()
+
+def observe_stage(name, seconds):
+    if ENABLED:
+        _stage_histogram(name).observe(seconds)
+
+def render():
+    """
+    Returns (body, content_type) for the /metrics endpoint, or None when metrics are off.
+    With several worker processes, set PROMETHEUS_MULTIPROC_DIR so all of them are reported.
+    """
+    if not ENABLED:
+        return None
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -1,3 +1,6 @@
+import math
+import re
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 def split_text(text, chunk_size=1000, chunk_overlap=200):
@@ -20,3 +23,33 @@ def create_documents(data_list):
             documents.append(Document(page_content=content, metadata=metadata))
             
     return documents
+
+def normalize_query(query):
+    return " ".join(query.lower().split()).strip(" .?!")
+
+BOILERPLATE_FILE = "boilerplate.json"
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in re.split(r"(?<=[.!?])\s+", text) if sentence.strip()]
+
+# Legal and site notices; these are dropped once they repeat on min_products pages, while
+# any other sentence must be on min_share of the catalog, since a product family's shared
+# description (e.g. the sample tasks of a sales job) is only on a few pages.
+NOTICE_PATTERN = re.compile(
+    r"\blaw \d+|\bregulation of\b|\bcompliance with\b|\byour responsibility\b|\bcopyright\b"
+    r"|all rights reserved|privacy (?:policy|notice)|terms (?:of use|and conditions)|\bcookies\b",
+    re.IGNORECASE,
+)
+
+def find_boilerplate(sentence_counts, product_count, min_share=0.25, min_products=3, min_length=30):
+    """
+    Returns the sentences that occur in at least max(min_products, min_share of all
+    products), or notices matching NOTICE_PATTERN found in at least min_products.
+    sentence_counts maps each sentence to the number of products containing it.
+    """
+    threshold = max(min_products, math.ceil(min_share * product_count))
+    return sorted(
+        sentence for sentence, count in sentence_counts.items()
+        if len(sentence) >= min_length
+        and (count >= threshold or (count >= min_products and NOTICE_PATTERN.search(sentence)))
+    )
@@ -0,0 +1,40 @@
+import time
+from contextlib import contextmanager
+
+from src.utils.metrics import observe_stage
+
+class StageTimer:
+    """
+    Accumulates wall-clock time per named stage, in milliseconds. Every stage is also
+    recorded in the stage latency histogram.
+    """
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed * 1000
+            observe_stage(name, elapsed)
+
+    def as_dict(self, digits=2):
+        return {name: round(ms, digits) for name, ms in self.timings.items()}
+
+def percentiles(values, points=(50, 95, 99), digits=3):
+    """
+    Returns {"p50": ..., "p95": ..., "p99": ...} for a list of millisecond samples.
+    """
+    if not values:
+        return {f"p{point}": None for point in points}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        # Nearest-rank percentile, so every reported value was actually observed.
+        rank = max(1, -(-point * len(ordered) // 100))
+        result[f"p{point}"] = round(ordered[int(rank) - 1], digits)
+    return result
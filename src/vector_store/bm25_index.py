@@ -0,0 +1,122 @@
+import os
+import re
+
+import numpy as np
+
+BM25_FILE = "bm25.npz"
+
+# Keeps product-style tokens intact: ".net", "c++", "c#", "g+", "opq32", "3.5".
+TOKEN_RE = re.compile(r"\.?[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|\.?[a-z0-9]")
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if token.startswith("."):
+            tokens.append(token[1:])
+    return tokens
+
+class BM25Index:
+    """
+    Array-backed BM25 inverted index over the rows of the FAISS index. Postings are stored
+    CSR-style (offsets, rows, weights) with the BM25 term weight precomputed per posting, so
+    scoring a query is a handful of vectorized adds.
+    """
+
+    def __init__(self, terms, offsets, rows, weights, ntotal):
+        self.vocab = {term: term_id for term_id, term in enumerate(terms)}
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.weights = weights
+        self.ntotal = ntotal
+
+    @classmethod
+    def build(cls, texts, k1=1.5, b=0.75):
+        postings = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[row] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((row, tf))
+
+        ntotal = len(texts)
+        avgdl = float(doc_lengths.mean()) if ntotal else 0.0
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        all_rows, all_weights = [], []
+        for term_id, term in enumerate(terms):
+            entries = postings[term]
+            rows = np.array([row for row, _ in entries], dtype=np.int32)
+            tf = np.array([count for _, count in entries], dtype=np.float32)
+            idf = np.log(1.0 + (ntotal - len(entries) + 0.5) / (len(entries) + 0.5))
+            norm = k1 * (1.0 - b + b * doc_lengths[rows] / max(avgdl, 1e-9))
+            all_rows.append(rows)
+            all_weights.append((idf * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32))
+            offsets[term_id + 1] = offsets[term_id] + len(entries)
+
+        rows = np.concatenate(all_rows) if all_rows else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate(all_weights) if all_weights else np.zeros(0, dtype=np.float32)
+        return cls(terms, offsets, rows, weights, ntotal)
+
+    def save(self, folder_path):
+        np.savez(
+            os.path.join(folder_path, BM25_FILE),
+            terms=np.array(self.terms, dtype=str),
+            offsets=self.offsets,
+            rows=self.rows,
+            weights=self.weights,
+            ntotal=np.array(self.ntotal)
+        )
+
+    @classmethod
+    def load(cls, folder_path):
+        path = os.path.join(folder_path, BM25_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(
+                data["terms"].tolist(), data["offsets"], data["rows"], data["weights"], int(data["ntotal"])
+            )
+
+    def scores(self, query):
+        scores = np.zeros(self.ntotal, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.rows[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query, n, allowed_rows=None):
+        """
+        Returns up to n FAISS rows with a positive BM25 score, best first.
+        """
+        scores = self.scores(query)
+        if allowed_rows is not None:
+            masked = np.zeros_like(scores)
+            masked[allowed_rows] = scores[allowed_rows]
+            scores = masked
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+def fused_scores(rankings, rrf_k=60):
+    """
+    Fuses ranked lists of row IDs by summing 1 / (rrf_k + rank) and returns (rows, scores)
+    as arrays, best first.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            if row < 0:
+                continue
+            fused[row] = fused.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    rows = sorted(fused, key=fused.get, reverse=True)
+    return np.asarray(rows, dtype=np.int64), np.asarray([fused[row] for row in rows], dtype=np.float64)
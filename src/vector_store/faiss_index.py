@@ -1,18 +1,330 @@
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.base import Docstore
 from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from urllib.request import pathname2url
 import faiss
+import numpy as np
+import json
 import os
-import pickle
+import sqlite3
+import shutil
+import threading
+import uuid
+
+# On-disk layout (no pickle): index.faiss in FAISS's native format, vectors.npy with the raw
+# embeddings, docs.sqlite with chunk text and metadata by FAISS row, and manifest.json.
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.sqlite"
+FORMAT_VERSION = 2
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+class SQLiteDocstore(Docstore):
+    """
+    Read-only docstore over docs.sqlite. Pages come from the OS page cache, so every worker
+    process shares them instead of holding its own copy of the corpus.
+    """
+
+    def __init__(self, path):
+        uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro&immutable=1"
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def search(self, search):
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM docs WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def row_ids(self):
+        with self._lock:
+            return self._conn.execute("SELECT row, id FROM docs ORDER BY row").fetchall()
+
+    def all_documents(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, text, metadata FROM docs ORDER BY row").fetchall()
+        return {
+            doc_id: Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+            for doc_id, text, metadata in rows
+        }
 
 def create_faiss_index(documents, embedding_model):
     vector_store = FAISS.from_documents(documents, embedding_model)
     return vector_store
 
-def save_faiss_index(vector_store, folder_path, index_name="index"):
+def default_index_params(index_type, ntotal, dimension):
+    if index_type == "hnsw":
+        return {"M": 32, "efConstruction": 200, "efSearch": 64}
+    if index_type in ("ivf_flat", "ivf_pq"):
+        # ~4 * sqrt(n) lists, keeping at least 39 training points per centroid as FAISS asks.
+        nlist = max(1, min(int(4 * np.sqrt(ntotal)), ntotal // 39))
+        params = {"nlist": nlist, "nprobe": min(nlist, 8)}
+        if index_type == "ivf_pq":
+            # About 8 dimensions per sub-quantizer; m must divide the dimension.
+            m = max(divisor for divisor in range(1, dimension // 8 + 1) if dimension % divisor == 0)
+            # PQ distances are coarse: fetch k_factor * k candidates and re-rank them exactly.
+            params.update({"m": m, "nbits": 8, "nprobe": min(nlist, 16), "k_factor": 4})
+        return params
+    return {}
+
+def build_index(vectors, index_type="flat", index_params=None):
+    """
+    Builds and fills a FAISS index of the given type. Returns (index, index_type, params);
+    corpora too small to train an IVF index fall back to flat.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type: {index_type} (expected one of {', '.join(INDEX_TYPES)})")
+    ntotal, dimension = vectors.shape
+    params = {**default_index_params(index_type, ntotal, dimension), **(index_params or {})}
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        min_points = max(39 * params["nlist"], 2 ** params.get("nbits", 0))
+        if ntotal < min_points:
+            print(f"{ntotal} vectors are too few to train {index_type} (need {min_points}); using a flat index.")
+            index_type, params = "flat", {}
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, params["M"])
+        index.hnsw.efConstruction = params["efConstruction"]
+    elif index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(faiss.IndexFlatL2(dimension), dimension, params["nlist"])
+    elif index_type == "ivf_pq":
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, params["nlist"], params["m"], params["nbits"])
+    else:
+        index = faiss.IndexFlatL2(dimension)
+
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    apply_search_params(index, index_type, params)
+    return index, index_type, params
+
+def apply_search_params(index, index_type, params):
+    if index_type == "hnsw":
+        index.hnsw.efSearch = params["efSearch"]
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+
+def search_parameters(vector_store, selector=None):
+    """
+    Per-search FAISS parameters carrying the index's tuned efSearch / nprobe, which FAISS
+    would otherwise reset to its defaults whenever parameters are passed explicitly.
+    """
+    index_type = getattr(vector_store, "index_type", "flat")
+    params = getattr(vector_store, "index_params", {})
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=params["efSearch"])
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=params["nprobe"])
+    return faiss.SearchParameters(sel=selector)
+
+def refine_with_exact(vectors, queries, rows, k):
+    """
+    Re-ranks candidate rows by exact L2 distance to the stored vectors and keeps the top k.
+    """
+    refined = np.full((len(queries), k), -1, dtype=np.int64)
+    for i, (query, candidates) in enumerate(zip(queries, rows)):
+        candidates = candidates[candidates >= 0]
+        if not len(candidates):
+            continue
+        distances = ((np.asarray(vectors[candidates], dtype=np.float32) - query) ** 2).sum(axis=1)
+        best = np.argsort(distances, kind="stable")[:k]
+        refined[i, :len(best)] = candidates[best]
+    return refined
+
+def search_index(vector_store, queries, k, params=None):
+    """
+    Returns the top-k FAISS rows per query, re-ranking with the exact vectors when the
+    index's parameters ask for it (k_factor > 1).
+    """
+    k_factor = getattr(vector_store, "index_params", {}).get("k_factor", 1)
+    _, rows = vector_store.index.search(queries, k * k_factor, params=params)
+    if k_factor > 1:
+        rows = refine_with_exact(vector_store.vectors, queries, rows, k)
+    return rows
+
+def create_faiss_index_from_vectors(documents, vectors, embedding_model, ids=None, index_type="flat", index_params=None):
+    """
+    Builds a FAISS store from precomputed embeddings with a single bulk add. The exact
+    vectors are kept on the store so they can be saved alongside an approximate index.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ids = ids or [str(uuid.uuid4()) for _ in documents]
+
+    index, index_type, index_params = build_index(vectors, index_type, index_params)
+
+    for doc_id, doc in zip(ids, documents):
+        doc.id = doc_id
+    docstore = InMemoryDocstore(dict(zip(ids, documents)))
+    index_to_docstore_id = dict(enumerate(ids))
+    vector_store = FAISS(embedding_model, index, docstore, index_to_docstore_id)
+    vector_store.vectors = vectors
+    vector_store.index_type = index_type
+    vector_store.index_params = index_params
+    return vector_store
+
+def _exact_vectors(vector_store):
+    index = vector_store.index
+    if isinstance(index, faiss.IndexFlat):
+        return index.reconstruct_n(0, index.ntotal)
+    return np.asarray(vector_store.vectors, dtype=np.float32)
+
+def _write_index(vector_store, folder_path, index_name):
+    index = vector_store.index
+    vectors = _exact_vectors(vector_store)
+    index_type = getattr(vector_store, "index_type", "flat")
+    index_params = getattr(vector_store, "index_params", {})
+    if index_type != "flat" and isinstance(index, faiss.IndexFlat):
+        # Writable stores are edited as flat indexes; the approximate index is rebuilt here.
+        index, index_type, index_params = build_index(vectors, index_type, index_params)
+    faiss.write_index(index, os.path.join(folder_path, f"{index_name}.faiss"))
+    np.save(os.path.join(folder_path, VECTORS_FILE), vectors)
+
+    conn = sqlite3.connect(os.path.join(folder_path, DOCS_FILE))
+    conn.execute("CREATE TABLE docs (row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+    conn.executemany(
+        "INSERT INTO docs (row, id, text, metadata) VALUES (?, ?, ?, ?)",
+        (
+            (row, doc_id, doc.page_content, json.dumps(doc.metadata))
+            for row, doc_id in sorted(vector_store.index_to_docstore_id.items())
+            for doc in [vector_store.docstore.search(doc_id)]
+        )
+    )
+    conn.commit()
+    conn.close()
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "index": f"{index_name}.faiss",
+        "dimension": index.d,
+        "ntotal": index.ntotal,
+        "index_type": index_type,
+        "index_params": index_params,
+        "normalize_L2": vector_store._normalize_L2,
+        "distance_strategy": str(vector_store.distance_strategy.value)
+    }
+    with open(os.path.join(folder_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+def save_faiss_index(vector_store, folder_path, index_name="index", extra_files=None):
+    """
+    Writes the index into a sibling temp directory, then renames each file into folder_path
+    with the FAISS index file last. folder_path never disappears, every file is replaced
+    atomically, and engines (which reload when the index file changes) only see the new
+    index once all its files are in place; processes still reading the old files keep
+    their open copies. extra_files maps file names to JSON payloads stored alongside the
+    index; a callable payload is instead called with the directory and writes its own file.
+    """
+    folder_path = os.path.abspath(folder_path)
+    tmp_path = f"{folder_path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+    os.makedirs(tmp_path)
+    _write_index(vector_store, tmp_path, index_name)
+    for name, payload in (extra_files or {}).items():
+        if callable(payload):
+            payload(tmp_path)
+            continue
+        with open(os.path.join(tmp_path, name), 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+
     os.makedirs(folder_path, exist_ok=True)
-    vector_store.save_local(folder_path, index_name)
+    index_file = f"{index_name}.faiss"
+    new_files = set(os.listdir(tmp_path))
+    stale_files = set(os.listdir(folder_path)) - new_files
+    for name in sorted(new_files - {index_file}) + [index_file]:
+        os.replace(os.path.join(tmp_path, name), os.path.join(folder_path, name))
+    # Files of the previous build that this one no longer writes (e.g. a legacy index.pkl).
+    for name in stale_files:
+        path = os.path.join(folder_path, name)
+        if os.path.isfile(path):
+            os.remove(path)
+    shutil.rmtree(tmp_path, ignore_errors=True)
+
+def texts_in_row_order(vector_store):
+    return [
+        vector_store.docstore.search(vector_store.index_to_docstore_id[row]).page_content
+        for row in range(vector_store.index.ntotal)
+    ]
+
+def load_index_file(folder_path, name):
+    path = os.path.join(folder_path, name)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _read_index(path, writable):
+    if writable:
+        return faiss.read_index(path)
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        return faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+def load_faiss_index(folder_path, embedding_model, index_name="index", writable=False):
+    """
+    Loads an index written by save_faiss_index without unpickling anything. By default the
+    FAISS index is memory-mapped read-only and documents are served from SQLite; pass
+    writable=True to get an in-memory store that supports add/delete.
+    """
+    manifest = load_index_file(folder_path, MANIFEST_FILE)
+    if manifest is None:
+        return _load_legacy_pickle_index(folder_path, embedding_model, index_name)
+
+    from langchain_community.vectorstores.utils import DistanceStrategy
+
+    index_type = manifest.get("index_type", "flat")
+    index_params = manifest.get("index_params", {})
+    vectors = np.load(os.path.join(folder_path, VECTORS_FILE), mmap_mode="r")
+    if writable and index_type != "flat":
+        # Approximate indexes cannot all delete vectors, so edits go to an exact flat copy
+        # and save_faiss_index rebuilds the approximate index from it.
+        index = faiss.IndexFlatL2(manifest["dimension"])
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    else:
+        index = _read_index(os.path.join(folder_path, manifest["index"]), writable)
+        apply_search_params(index, index_type, index_params)
+    docstore = SQLiteDocstore(os.path.join(folder_path, DOCS_FILE))
+    index_to_docstore_id = dict(docstore.row_ids())
+    if writable:
+        docstore = InMemoryDocstore(docstore.all_documents())
+
+    vector_store = FAISS(
+        embedding_model,
+        index,
+        docstore,
+        index_to_docstore_id,
+        normalize_L2=manifest.get("normalize_L2", False),
+        distance_strategy=DistanceStrategy(manifest.get("distance_strategy", DistanceStrategy.EUCLIDEAN_DISTANCE.value))
+    )
+    vector_store.vectors = vectors
+    vector_store.index_type = index_type
+    vector_store.index_params = index_params
+    return vector_store
+
+def load_docstore(folder_path):
+    """
+    Opens only the document store of an index, for processes that delegate search elsewhere.
+    """
+    if load_index_file(folder_path, MANIFEST_FILE) is None:
+        raise ValueError(
+            f"{folder_path} uses the legacy pickle format, which has no standalone docstore. "
+            "Re-run src/ingestion/load_catalog.py to convert it."
+        )
+    return SQLiteDocstore(os.path.join(folder_path, DOCS_FILE))
 
-def load_faiss_index(folder_path, embedding_model, index_name="index"):
+def _load_legacy_pickle_index(folder_path, embedding_model, index_name):
+    if os.getenv("ALLOW_PICKLE_INDEX", "1") == "0":
+        raise ValueError(
+            f"{folder_path} uses the legacy pickle format and ALLOW_PICKLE_INDEX=0. "
+            "Re-run src/ingestion/load_catalog.py to convert it."
+        )
+    print(f"Warning: {folder_path} uses the legacy pickle format; re-run ingestion to convert it.")
     vector_store = FAISS.load_local(
         folder_path, 
         embedding_model, 
@@ -0,0 +1,111 @@
+import numpy as np
+
+from src.utils.metadata import test_type_codes, yes_no
+
+FILTER_FIELDS = ("max_duration", "test_types", "remote", "adaptive")
+
+def normalize_filters(filters):
+    """
+    Drops unset filters and returns a hashable, order-independent key, or None when nothing is filtered.
+    """
+    if not filters:
+        return None
+    items = []
+    for field in FILTER_FIELDS:
+        value = filters.get(field)
+        if value is None or value == [] or value == ():
+            continue
+        if field == "test_types":
+            value = tuple(sorted({code.strip().upper() for code in value}))
+        items.append((field, value))
+    return tuple(items) or None
+
+class FilterIndex:
+    """
+    Posting lists of FAISS row IDs for each filterable value, built from the metadata
+    store when the index is loaded. A filter is resolved by intersecting posting lists and
+    handed to FAISS as an ID selector, so only matching vectors are ever scored.
+    """
+
+    def __init__(self, metadata_store, index_to_docstore_id):
+        self.ntotal = len(index_to_docstore_id)
+        product_rows = np.full(self.ntotal, -1, dtype=np.int64)
+        for row, doc_id in index_to_docstore_id.items():
+            product_row = metadata_store.row_of(doc_id)
+            if product_row is not None:
+                product_rows[row] = product_row
+        # FAISS row -> metadata store product row (-1 if unknown), also used to group chunks by product.
+        self.product_rows = product_rows
+
+        columns = metadata_store.columns
+        known = np.flatnonzero(product_rows >= 0)
+
+        durations = np.array(
+            [columns["duration_minutes"][product_rows[row]] for row in known], dtype=object
+        )
+        has_duration = np.array([value is not None for value in durations], dtype=bool)
+        duration_rows = known[has_duration]
+        duration_values = durations[has_duration].astype(np.float64)
+        order = np.argsort(duration_values, kind="stable")
+        # Rows sorted by duration; a max_duration filter is a prefix found by binary search.
+        self.duration_rows = duration_rows[order]
+        self.duration_values = duration_values[order]
+
+        self.test_type_postings = {}
+        self.remote_postings = {True: [], False: []}
+        self.adaptive_postings = {True: [], False: []}
+        for row in known:
+            product_row = product_rows[row]
+            for code in test_type_codes(columns["test_type"][product_row]):
+                self.test_type_postings.setdefault(code, []).append(row)
+            remote = yes_no(columns["remote"][product_row])
+            if remote is not None:
+                self.remote_postings[remote].append(row)
+            adaptive = yes_no(columns["adaptive"][product_row])
+            if adaptive is not None:
+                self.adaptive_postings[adaptive].append(row)
+
+        to_array = lambda rows: np.asarray(rows, dtype=np.int64)
+        self.test_type_postings = {code: to_array(rows) for code, rows in self.test_type_postings.items()}
+        self.remote_postings = {value: to_array(rows) for value, rows in self.remote_postings.items()}
+        self.adaptive_postings = {value: to_array(rows) for value, rows in self.adaptive_postings.items()}
+
+    def select_rows(self, filter_key):
+        """
+        Returns the sorted FAISS rows matching every filter in filter_key, or None if unfiltered.
+        """
+        if not filter_key:
+            return None
+
+        selected = None
+        for field, value in filter_key:
+            if field == "max_duration":
+                cutoff = np.searchsorted(self.duration_values, float(value), side="right")
+                rows = np.sort(self.duration_rows[:cutoff])
+            elif field == "test_types":
+                # Any of the requested test types matches.
+                postings = [self.test_type_postings.get(code) for code in value]
+                postings = [rows for rows in postings if rows is not None]
+                rows = np.unique(np.concatenate(postings)) if postings else np.zeros(0, dtype=np.int64)
+            elif field == "remote":
+                rows = self.remote_postings[bool(value)]
+            elif field == "adaptive":
+                rows = self.adaptive_postings[bool(value)]
+            else:
+                raise ValueError(f"Unknown filter: {field}")
+
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+            if len(selected) == 0:
+                break
+        return selected
+
+    def selector(self, rows):
+        import faiss
+
+        mask = np.zeros(self.ntotal, dtype=bool)
+        mask[rows] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(bitmap)
+        # FAISS only keeps a raw pointer to the bitmap.
+        selector.bitmap_ref = bitmap
+        return selector
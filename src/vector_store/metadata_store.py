@@ -0,0 +1,53 @@
+from src.utils.metadata import METADATA_FIELDS
+
+METADATA_FILE = "metadata.json"
+
+class MetadataStore:
+    """
+    Column-oriented store of per-assessment fields extracted at ingestion time. Each column
+    holds one value per product; doc_index maps every chunk ID to its product row, so a
+    lookup is two dictionary/list accesses instead of re-parsing the chunk text.
+    """
+
+    def __init__(self, products=None, columns=None, doc_index=None):
+        self.products = products or []
+        self.columns = columns or {field: [] for field in METADATA_FIELDS}
+        self.doc_index = doc_index or {}
+
+    @classmethod
+    def build(cls, product_metadata, doc_products):
+        """
+        product_metadata maps product key -> field dict; doc_products maps chunk ID -> product key.
+        """
+        products = list(product_metadata)
+        rows = {product: row for row, product in enumerate(products)}
+        columns = {
+            field: [product_metadata[product].get(field) for product in products]
+            for field in METADATA_FIELDS
+        }
+        doc_index = {doc_id: rows[product] for doc_id, product in doc_products.items() if product in rows}
+        return cls(products, columns, doc_index)
+
+    @classmethod
+    def from_payload(cls, payload):
+        if not payload:
+            return cls()
+        return cls(payload["products"], payload["columns"], payload["doc_index"])
+
+    def to_payload(self):
+        return {"products": self.products, "columns": self.columns, "doc_index": self.doc_index}
+
+    def row_of(self, doc_id):
+        return self.doc_index.get(doc_id)
+
+    def get_row(self, row):
+        return {field: values[row] for field, values in self.columns.items()}
+
+    def get(self, doc_id):
+        row = self.doc_index.get(doc_id)
+        if row is None:
+            return None
+        return self.get_row(row)
+
+    def __len__(self):
+        return len(self.products)
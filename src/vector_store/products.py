@@ -0,0 +1,33 @@
+import numpy as np
+
+AGGREGATIONS = ("max", "sum")
+
+def aggregate_by_product(rows, scores, product_rows, k, aggregation="max"):
+    """
+    Collapses ranked chunk rows (best first, higher score = better) into products.
+
+    product_rows maps every FAISS row to its product (-1 if unknown; such chunks count
+    as products of their own). A product's score is the max or sum of its chunk scores,
+    ties keep the order in which products first appear. Returns (the best-ranked chunk
+    row of each of the top k products, number of distinct products among rows).
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    valid = rows >= 0
+    rows, scores = rows[valid], scores[valid]
+    if not len(rows):
+        return rows, 0
+
+    products = product_rows[rows]
+    products = np.where(products >= 0, products, -(rows + 1))
+    unique, first, inverse = np.unique(products, return_index=True, return_inverse=True)
+    if aggregation == "sum":
+        totals = np.bincount(inverse, weights=scores, minlength=len(unique))
+    elif aggregation == "max":
+        totals = np.full(len(unique), -np.inf)
+        np.maximum.at(totals, inverse, scores)
+    else:
+        raise ValueError(f"Unknown product aggregation: {aggregation}")
+
+    best = np.lexsort((first, -totals))[:k]
+    return rows[first[best]], len(unique)
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from src.config import FAISS_INDEX_DIR
+from src.vector_store.faiss_index import (
+    build_index, apply_search_params, load_index_file, search_index, INDEX_TYPES, MANIFEST_FILE, VECTORS_FILE
+)
+
+# Search-time knob swept for each approximate index type.
+SWEEPS = {
+    "hnsw": ("efSearch", [16, 32, 64, 128, 256, 512]),
+    "ivf_flat": ("nprobe", [1, 2, 4, 8, 16, 32, 64, 128, 256]),
+    "ivf_pq": ("nprobe", [1, 2, 4, 8, 16, 32, 64, 128, 256]),
+}
+
+def _sample_queries(vectors, num_queries, seed=0):
+    """
+    Stored vectors with a little Gaussian noise, so a query's nearest neighbour is not
+    trivially itself.
+    """
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    scale = 0.1 * float(np.linalg.norm(picked, axis=1).mean()) / np.sqrt(vectors.shape[1])
+    return np.ascontiguousarray(picked + rng.normal(0, scale, picked.shape), dtype=np.float32)
+
+def _dataset_queries():
+    from src.embeddings.embedder import get_embedding_model, embed_queries
+    from src.evaluation.recall import load_labeled_queries
+
+    queries = list(load_labeled_queries())
+    return np.asarray(embed_queries(get_embedding_model(), queries), dtype=np.float32)
+
+def _measure(index, vectors, params, queries, truth, k):
+    # Searched the way the engine does, including any exact re-ranking step.
+    store = SimpleNamespace(index=index, vectors=vectors, index_params=params)
+    latencies = []
+    found = np.zeros((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        rows = search_index(store, query[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found[i] = rows[0]
+    recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)])
+    return {
+        "recall": round(float(recall), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+    }
+
+def tune(index_type, index_path=FAISS_INDEX_DIR, k=10, num_queries=500, target_recall=0.95,
+         build_params=None, dataset_queries=False):
+    """
+    Builds an index of index_type from the exact vectors stored with the index, sweeps its
+    search knob and reports Recall@k against exact flat search plus per-query latency.
+    Returns (index, params, report) where params carry the smallest knob value reaching
+    target_recall (or the largest value tried).
+    """
+    vectors = np.ascontiguousarray(np.load(os.path.join(index_path, VECTORS_FILE)), dtype=np.float32)
+    queries = _dataset_queries() if dataset_queries else _sample_queries(vectors, num_queries)
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, k)
+    report = {
+        "ntotal": len(vectors),
+        "queries": len(queries),
+        "k": k,
+        "flat": _measure(flat, vectors, {}, queries, truth, k),
+    }
+
+    started = time.perf_counter()
+    index, built_type, params = build_index(vectors, index_type, build_params)
+    report["build_seconds"] = round(time.perf_counter() - started, 2)
+    report["index_type"] = built_type
+    report["index_bytes"] = int(faiss.serialize_index(index).nbytes)
+    if built_type == "flat":
+        report["params"] = params
+        return index, params, report
+
+    knob, values = SWEEPS[built_type]
+    if knob == "nprobe":
+        values = [value for value in values if value <= params["nlist"]] or [params["nlist"]]
+    sweep = []
+    for value in values:
+        trial = {**params, knob: value}
+        apply_search_params(index, built_type, trial)
+        sweep.append({knob: value, **_measure(index, vectors, trial, queries, truth, k)})
+    report["sweep"] = sweep
+
+    chosen = next((row for row in sweep if row["recall"] >= target_recall), sweep[-1])
+    params = {**params, knob: chosen[knob]}
+    apply_search_params(index, built_type, params)
+    report["params"] = params
+    return index, params, report
+
+def save_tuned_index(index, index_type, params, index_path=FAISS_INDEX_DIR):
+    """
+    Replaces index.faiss and records the type and parameters in manifest.json. Readers that
+    memory-mapped the old file keep it until they reload.
+    """
+    manifest = load_index_file(index_path, MANIFEST_FILE)
+    if manifest is None:
+        raise ValueError(f"{index_path} has no {MANIFEST_FILE}; re-run ingestion to convert it first.")
+
+    index_file = os.path.join(index_path, manifest["index"])
+    faiss.write_index(index, f"{index_file}.tmp")
+    manifest.update({"index_type": index_type, "index_params": params})
+    with open(os.path.join(index_path, f"{MANIFEST_FILE}.tmp"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(index_path, f"{MANIFEST_FILE}.tmp"), os.path.join(index_path, MANIFEST_FILE))
+    # Engines reload when index.faiss changes, so it is swapped last.
+    os.replace(f"{index_file}.tmp", index_file)
+
+def _print_report(report):
+    print(f"{report['ntotal']} vectors, {report['queries']} queries, Recall@{report['k']} vs exact flat search")
+    flat = report["flat"]
+    print(f"flat: p50 {flat['p50_ms']:.3f} ms, p95 {flat['p95_ms']:.3f} ms")
+    print(f"{report['index_type']}: built in {report['build_seconds']}s, {report['index_bytes'] / 1e6:.1f} MB")
+    for row in report.get("sweep", []):
+        knob = next(iter(row))
+        print(f"  {knob}={row[knob]:<4} recall {row['recall']:.4f}  p50 {row['p50_ms']:.3f} ms  p95 {row['p95_ms']:.3f} ms")
+    print(f"Chosen parameters: {report['params']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep FAISS search parameters for recall vs latency.")
+    parser.add_argument("--index-type", choices=[t for t in INDEX_TYPES if t != "flat"], required=True)
+    parser.add_argument("--index-path", default=FAISS_INDEX_DIR)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500, help="Number of sampled query vectors.")
+    parser.add_argument("--dataset-queries", action="store_true",
+                        help="Embed the labeled evaluation queries instead of sampling stored vectors.")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--M", type=int, help="HNSW graph degree.")
+    parser.add_argument("--ef-construction", type=int, help="HNSW build-time beam width.")
+    parser.add_argument("--nlist", type=int, help="Number of IVF lists.")
+    parser.add_argument("--pq-m", type=int, help="Number of PQ sub-quantizers (must divide the dimension).")
+    parser.add_argument("--k-factor", type=int, help="IVF-PQ: candidates per result re-ranked with exact vectors.")
+    parser.add_argument("--save", action="store_true", help="Write the tuned index and parameters into the index directory.")
+    parser.add_argument("--output", help="Also write the report as JSON to this path.")
+    args = parser.parse_args()
+
+    build_params = {
+        name: value for name, value in (
+            ("M", args.M), ("efConstruction", args.ef_construction), ("nlist", args.nlist), ("m", args.pq_m),
+            ("k_factor", args.k_factor)
+        ) if value is not None
+    }
+    index, params, report = tune(
+        args.index_type, args.index_path, k=args.k, num_queries=args.queries, target_recall=args.target_recall,
+        build_params=build_params, dataset_queries=args.dataset_queries
+    )
+    _print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save:
+        save_tuned_index(index, report["index_type"], params, args.index_path)
+        print(f"Saved {report['index_type']} index to {args.index_path}")